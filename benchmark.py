@@ -0,0 +1,281 @@
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from plugins.scripts import jats, profiling
+
+
+# Number of body sections in each size of generated galley. Large galleys
+# have a long body and reference list after <front>, which is what
+# streaming extraction avoids parsing.
+GALLEY_SIZES = {
+    "small": 2,
+    "large": 400,
+}
+
+# Inline elements used for heavy markup, with their attributes. These cover
+# the templates in xsl/titles.xsl and xsl/abstracts.xsl as well as elements
+# that fall through to their default rules.
+INLINE_ELEMENTS = [
+    ("italic", ""),
+    ("bold", ""),
+    ("sup", ""),
+    ("sub", ""),
+    ("sc", ""),
+    ("monospace", ""),
+    ("underline", ""),
+    ("ext-link", ' ext-link-type="uri" xlink:href="https://example.org/{n}"'),
+    ("xref", ' ref-type="bibr" rid="R{n}"'),
+]
+
+WORDS = (
+    "analysis archive article bibliography citation corpus dataset digital "
+    "edition evidence history journal language library manuscript method "
+    "network open periodical press publishing reader research review "
+    "scholarly source study text theory"
+).split()
+
+GALLEY_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<article xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:mml="http://www.w3.org/1998/Math/MathML" article-type="research-article">
+<front>
+<journal-meta><journal-id>benchmark</journal-id></journal-meta>
+<article-meta>
+<article-id pub-id-type="doi">10.0000/benchmark.{index}</article-id>
+<title-group><article-title>{title}</article-title></title-group>
+<abstract>{abstract}</abstract>
+</article-meta>
+</front>
+<body>{body}</body>
+<back><ref-list>{refs}</ref-list></back>
+</article>
+"""
+
+
+def inline_text(rng, words, markup, depth=0):
+    """Returns a run of text with nested inline elements when markup is
+    "heavy" and plain words otherwise."""
+    parts = []
+    for _ in range(words):
+        word = rng.choice(WORDS)
+        if markup == "heavy" and depth < 3 and rng.random() < 0.3:
+            tag, attributes = rng.choice(INLINE_ELEMENTS)
+            inner = inline_text(rng, rng.randint(1, 3), markup, depth + 1)
+            word = "<{tag}{attributes}>{inner}</{tag}>".format(
+                tag=tag,
+                attributes=attributes.format(n=rng.randint(1, 50)),
+                inner=inner,
+            )
+        parts.append(word)
+    return " ".join(parts)
+
+
+def generate_galley(rng, index, size="small", markup="heavy", sections=None):
+    """Returns the bytes of a synthetic JATS galley.
+
+    :param rng: a random.Random
+    :param index: a number identifying the galley
+    :param size: a key of GALLEY_SIZES
+    :param markup: "heavy" for nested inline markup or "plain" for none
+    :param sections: the number of body sections, overriding size
+    """
+    sections = sections or GALLEY_SIZES[size]
+    abstract = "".join(
+        "<p>{}</p>".format(inline_text(rng, 40, markup))
+        for _ in range(3)
+    )
+    body = "".join(
+        '<sec id="s{n}"><title>{title}</title>{paragraphs}</sec>'.format(
+            n=n,
+            title=inline_text(rng, 4, markup),
+            paragraphs="".join(
+                "<p>{}</p>".format(inline_text(rng, 80, markup))
+                for _ in range(5)
+            ),
+        )
+        for n in range(sections)
+    )
+    refs = "".join(
+        '<ref id="R{n}"><mixed-citation>{text}</mixed-citation></ref>'.format(
+            n=n,
+            text=inline_text(rng, 20, markup),
+        )
+        for n in range(sections * 2)
+    )
+    return GALLEY_TEMPLATE.format(
+        index=index,
+        title=inline_text(rng, 12, markup),
+        abstract=abstract,
+        body=body,
+        refs=refs,
+    ).encode()
+
+
+def generate_corpus(
+    directory,
+    count,
+    large_ratio=0.1,
+    markup="heavy",
+    large_sections=None,
+    seed=0,
+):
+    """Writes a reproducible corpus of synthetic galleys to a directory.
+
+    :return: a list of (size, path) tuples
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for index in range(count):
+        size = "large" if rng.random() < large_ratio else "small"
+        path = os.path.join(directory, f"galley-{index}.xml")
+        with open(path, "wb") as galley:
+            galley.write(generate_galley(
+                rng,
+                index,
+                size=size,
+                markup=markup,
+                sections=large_sections if size == "large" else None,
+            ))
+        corpus.append((size, path))
+    return corpus
+
+
+class StageTimer:
+    """Collects the duration of each call to the stages of a pipeline."""
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.setdefault(name, []).append(
+                time.perf_counter() - start,
+            )
+
+    def stats(self):
+        """Returns a dict of the call count, total, mean, median, 95th
+        percentile and maximum duration in seconds, keyed by stage."""
+        stats = {}
+        for name, durations in self.durations.items():
+            ordered = sorted(durations)
+            stats[name] = {
+                "calls": len(ordered),
+                "total": sum(ordered),
+                "mean": statistics.mean(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                "max": ordered[-1],
+            }
+        return stats
+
+
+@contextmanager
+def measure(trace_memory=True):
+    """Measures the wall time and peak traced memory of a block.
+
+    Yields a dict that is given "seconds", "peak_memory" and "max_rss" in
+    bytes once the block exits. Only allocations made by Python in this
+    process are traced: lxml builds trees and runs XSLT with its own
+    allocator and work in worker processes is not included. max_rss is the
+    high-water mark of the whole process so far, which covers those.
+
+    Tracing slows down code that allocates Python objects much more than
+    code running in lxml, such as the native engine compared to the XSLT.
+    When trace_memory is False, nothing is traced and peak_memory is None.
+    """
+    result = {}
+    already_tracing = tracemalloc.is_tracing()
+    if trace_memory and not already_tracing:
+        tracemalloc.start()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        result["peak_memory"] = (
+            tracemalloc.get_traced_memory()[1] if trace_memory else None
+        )
+        result["max_rss"] = profiling.max_rss()
+        if trace_memory and not already_tracing:
+            tracemalloc.stop()
+
+
+def benchmark_stages(
+    paths,
+    mappings,
+    streaming=True,
+    timer=None,
+    engine=jats.XSLT_ENGINE,
+):
+    """Runs the extraction pipeline over galley files, timing each stage.
+
+    The stages are the same steps as jats.extract_fields: parsing the
+    <front> or whole galley, finding each mapped element, rendering it
+    without a transform if it has no markup, and otherwise running its XSLT
+    or native rules and serialising the result.
+
+    :param paths: galley file paths
+    :param mappings: an iterable of jats.FieldMapping
+    :param streaming: when True, parse only the <front> of each galley
+        unless an element is not found there
+    :param timer: an optional StageTimer to add to
+    :param engine: the jats engine used to transform elements
+    :return: the StageTimer
+    """
+    mappings = list(mappings)
+    timer = timer or StageTimer()
+    with timer.stage(f"load_{engine}"):
+        transforms = jats.load_transforms(mappings, engine)
+
+    for path in paths:
+        with timer.stage("galley"):
+            remaining = mappings
+            if streaming:
+                with timer.stage("parse_front"):
+                    front = jats.parse_front(path)
+                if front is not None:
+                    remaining = run_stages(
+                        front,
+                        mappings,
+                        transforms,
+                        timer,
+                        engine,
+                    )
+            if remaining:
+                with timer.stage("parse_galley"):
+                    tree = jats.parse_galley(path)
+                run_stages(tree, remaining, transforms, timer, engine)
+    return timer
+
+
+def run_stages(tree, mappings, transforms, timer, engine=jats.XSLT_ENGINE):
+    """Times the find, plain, transform and serialise stages of each mapping.
+
+    :return: the mappings whose element was not found
+    """
+    missing = []
+    for mapping in mappings:
+        with timer.stage("find"):
+            element = tree.find(mapping.xpath)
+        if element is None:
+            missing.append(mapping)
+            continue
+        if mapping.plain_tags is not None:
+            with timer.stage("plain"):
+                value = jats.render_plain(element, mapping.plain_tags)
+            if value is not None:
+                continue
+        with timer.stage(f"{engine}_{mapping.name}"):
+            result = transforms[mapping.name](element)
+        with timer.stage("serialise"):
+            str(result).strip()
+    return missing
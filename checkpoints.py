@@ -0,0 +1,38 @@
+import hashlib
+import json
+
+from plugins.scripts import models
+
+
+def get_key(options):
+    """Returns a key identifying a run of a command from its options.
+
+    :param options: a dict of the JSON serialisable options that select
+        what the command processes
+    """
+    encoded = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def get_position(command, key):
+    """Returns the position recorded for a run of a command, or None."""
+    return models.CommandCheckpoint.objects.filter(
+        command=command,
+        key=key,
+    ).values_list('position', flat=True).first()
+
+
+def save_position(command, key, position):
+    models.CommandCheckpoint.objects.update_or_create(
+        command=command,
+        key=key,
+        defaults={'position': position},
+    )
+
+
+def clear(command, key):
+    """Removes the checkpoint of a run once it has completed."""
+    models.CommandCheckpoint.objects.filter(
+        command=command,
+        key=key,
+    ).delete()
@@ -1,5 +1,11 @@
 from django import forms
 
+from plugins.scripts.jats import (
+    FIELD_MAPPINGS,
+    NATIVE_ENGINE,
+    XSLT_ENGINE,
+)
+
 
 class TransformForm(forms.Form):
     article_id = forms.IntegerField(
@@ -10,6 +16,16 @@ class TransformForm(forms.Form):
         required=False,
         label="Issue ID",
     )
+    engine = forms.ChoiceField(
+        choices=[
+            (XSLT_ENGINE, "XSLT"),
+            (NATIVE_ENGINE, "Native"),
+        ],
+        initial=XSLT_ENGINE,
+        required=False,
+        label="Engine",
+        help_text="Native rules give the same output as the XSLT.",
+    )
 
     def clean(self):
         cleaned_data = super().clean()
@@ -25,3 +41,15 @@ class TransformForm(forms.Form):
             )
 
         return cleaned_data
+
+
+class JATSTransformForm(TransformForm):
+    field_names = forms.MultipleChoiceField(
+        choices=[
+            (name, mapping.label)
+            for name, mapping in FIELD_MAPPINGS.items()
+        ],
+        initial=list(FIELD_MAPPINGS),
+        widget=forms.CheckboxSelectMultiple,
+        label="Fields",
+    )
@@ -0,0 +1,260 @@
+import html
+import os
+
+from django.conf import settings
+from lxml import etree
+
+from plugins.scripts import native, profiling
+
+
+# JATS places the title, abstract and other article metadata in <front>, so
+# streaming extraction can stop parsing once this element is closed.
+FRONT_TAG = "front"
+
+# The attribute XML galleys are prefetched to by transform.fetch_articles.
+PREFETCHED_XML_GALLEYS = "prefetched_xml_galleys"
+
+# Engines that transform JATS elements to HTML, see load_transforms.
+XSLT_ENGINE = "xslt"
+NATIVE_ENGINE = "native"
+ENGINES = [XSLT_ENGINE, NATIVE_ENGINE]
+
+XSL_DIR = os.path.join(
+    settings.BASE_DIR,
+    "plugins",
+    "scripts",
+    "xsl",
+)
+
+
+class FieldMapping:
+    """Describes how a single Article field is generated from a JATS galley.
+
+    :param name: the name used to select the mapping, e.g. on the command line
+    :param xpath: path to the JATS element, relative to the galley root
+    :param xslt_file: path to the XSLT used to transform the element
+    :param field: the Article field the result is written to, defaults to name
+    :param plain_tags: when not None, elements without markup are rendered
+        by render_plain rather than the XSLT. The tags are those of children
+        the XSLT outputs as the same HTML element around their text.
+    :param native_rules: the native.NativeRules equivalent to the XSLT, used
+        by the native engine
+    """
+
+    def __init__(
+        self,
+        name,
+        xpath,
+        xslt_file,
+        field=None,
+        plain_tags=None,
+        native_rules=None,
+    ):
+        self.name = name
+        self.xpath = xpath
+        self.xslt_file = xslt_file
+        self.field = field or name
+        self.plain_tags = plain_tags
+        self.native_rules = native_rules
+
+    @property
+    def label(self):
+        return self.name.replace("_", " ").capitalize()
+
+    def with_xslt_file(self, xslt_file):
+        """Returns a copy of the mapping using another XSLT file. The output
+        of render_plain and the native rules are only known to match the
+        bundled stylesheets, so neither is used with any other."""
+        same_xslt = os.path.abspath(xslt_file) == os.path.abspath(self.xslt_file)
+        return FieldMapping(
+            self.name,
+            self.xpath,
+            xslt_file,
+            field=self.field,
+            plain_tags=self.plain_tags if same_xslt else None,
+            native_rules=self.native_rules if same_xslt else None,
+        )
+
+
+# New mappings only need an entry here to be picked up by jats_to_html and
+# the transform view.
+FIELD_MAPPINGS = {
+    mapping.name: mapping for mapping in [
+        FieldMapping(
+            "title",
+            ".//title-group/article-title",
+            os.path.join(XSL_DIR, "titles.xsl"),
+            plain_tags=(),
+            native_rules=native.TITLE_RULES,
+        ),
+        FieldMapping(
+            "abstract",
+            ".//abstract",
+            os.path.join(XSL_DIR, "abstracts.xsl"),
+            plain_tags=("p",),
+            native_rules=native.ABSTRACT_RULES,
+        ),
+    ]
+}
+
+
+def load_transform(xslt_file_path):
+    with open(xslt_file_path, 'rb') as xslt_file:
+        xslt_root = etree.XML(xslt_file.read())
+    return etree.XSLT(xslt_root)
+
+
+def load_transforms(mappings, engine=XSLT_ENGINE):
+    """Returns the transform for each mapping keyed by mapping name.
+
+    :param mappings: an iterable of FieldMapping
+    :param engine: XSLT_ENGINE for the compiled XSLT of each mapping, or
+        NATIVE_ENGINE for a native.NativeTransform of its native rules
+    """
+    transforms = {}
+    for mapping in mappings:
+        if engine == NATIVE_ENGINE:
+            if mapping.native_rules is None:
+                raise ValueError(
+                    f"The native engine has no rules equivalent to "
+                    f"{mapping.xslt_file}."
+                )
+            transforms[mapping.name] = native.NativeTransform(
+                mapping.native_rules,
+            )
+        else:
+            transforms[mapping.name] = load_transform(mapping.xslt_file)
+    return transforms
+
+
+def get_galley_file_path(article):
+    """Returns the path of the first XML galley file of an article or None."""
+    prefetched = getattr(article, PREFETCHED_XML_GALLEYS, None)
+    if prefetched is not None:
+        xml_galley = prefetched[0] if prefetched else None
+    else:
+        xml_galley = article.xml_galleys.first()
+    if not xml_galley:
+        return None
+    return xml_galley.file.get_file_path(article)
+
+
+def parse_galley(file_path):
+    with profiling.stage('read_galley'):
+        with open(file_path, 'rb') as file:
+            xml_content = file.read()
+    with profiling.stage('parse_galley'):
+        return etree.fromstring(xml_content)
+
+
+def parse_front(file_path):
+    """Parses a galley only as far as the end of its <front> element.
+
+    :param file_path: path to the galley file
+    :return: the <front> element or None if the galley does not have one
+    """
+    with profiling.stage('parse_front'), open(file_path, 'rb') as file:
+        for _event, element in etree.iterparse(
+            file,
+            events=('end',),
+            tag=FRONT_TAG,
+        ):
+            return element
+    return None
+
+
+def render_plain(element, plain_tags=()):
+    """Renders an element without markup as the bundled stylesheets would.
+
+    Text is escaped as by the XSLT html output method, which leaves quotes
+    and non-ASCII characters as they are. Children with one of plain_tags
+    that only hold text are output as the same element, without attributes.
+
+    :return: the rendered element, or None if it has any other children,
+        including comments, and needs the XSLT
+    """
+    parts = [html.escape(element.text or "", quote=False)]
+    for child in element:
+        if child.tag not in plain_tags or len(child):
+            return None
+        parts.append("<{tag}>{text}</{tag}>".format(
+            tag=child.tag,
+            text=html.escape(child.text or "", quote=False),
+        ))
+        parts.append(html.escape(child.tail or "", quote=False))
+    return "".join(parts).strip()
+
+
+def transform_element(element, transform, plain_tags=None):
+    """Returns the HTML for an element, from render_plain when plain_tags
+    is given and the element has no markup, otherwise from the transform,
+    a compiled XSLT or a native.NativeTransform."""
+    if plain_tags is not None:
+        with profiling.stage('plain'):
+            value = render_plain(element, plain_tags)
+        if value is not None:
+            return value
+    with profiling.stage(getattr(transform, 'engine', XSLT_ENGINE)):
+        result = transform(element)
+    with profiling.stage('serialise'):
+        return str(result).strip()
+
+
+def apply_mappings(xml_tree, mappings, transforms):
+    """Runs every mapping against a single parsed galley.
+
+    :param xml_tree: the root element of the galley
+    :param mappings: an iterable of FieldMapping
+    :param transforms: a dict of transforms keyed by mapping name, see
+        load_transforms
+    :return: a tuple of a dict of new values keyed by Article field and a
+        list of the names of mappings whose element was not found
+    """
+    values = {}
+    missing = []
+    for mapping in mappings:
+        element = xml_tree.find(mapping.xpath)
+        if element is None:
+            missing.append(mapping.name)
+            continue
+        values[mapping.field] = transform_element(
+            element,
+            transforms[mapping.name],
+            plain_tags=mapping.plain_tags,
+        )
+    return values, missing
+
+
+def extract_fields(file_path, mappings, transforms, streaming=True):
+    """Reads a galley and applies mappings to it.
+
+    When streaming, only the <front> of the galley is parsed. Any mapping
+    whose element is not found there falls back to a full parse of the
+    galley. As the rest of the galley is not read, a galley that is only
+    well-formed up to the end of <front> gives values when streaming, where
+    a full parse raises an XMLSyntaxError.
+
+    :param file_path: path to the galley file
+    :param mappings: an iterable of FieldMapping
+    :param transforms: a dict of transforms keyed by mapping name, see
+        load_transforms
+    :param streaming: when False, always parse the full galley
+    :return: the same tuple as apply_mappings
+    """
+    mappings = list(mappings)
+    values = {}
+
+    if streaming:
+        front = parse_front(file_path)
+        if front is not None:
+            values, missing = apply_mappings(front, mappings, transforms)
+            if not missing:
+                return values, missing
+            mappings = [
+                mapping for mapping in mappings if mapping.name in missing
+            ]
+
+    xml_tree = parse_galley(file_path)
+    full_values, missing = apply_mappings(xml_tree, mappings, transforms)
+    values.update(full_values)
+    return values, missing
@@ -0,0 +1,139 @@
+import json
+import os
+import traceback
+
+from django.conf import settings
+from django.core.management import call_command, load_command_class
+from django.utils import timezone
+
+from plugins.scripts import models
+
+
+STALE_JOB_ERROR = (
+    "The worker running this job stopped reporting progress and is assumed "
+    "to have stopped."
+)
+
+
+def enqueue(journal, command, options, user=None):
+    """Queues a transform command to be run by run_transform_jobs.
+
+    :param journal: the Journal the job was requested for
+    :param command: the name of the management command to run
+    :param options: a dict of JSON serialisable options for the command
+    :param user: the Account that requested the job
+    :return: the new TransformJob
+    """
+    job = models.TransformJob(
+        journal=journal,
+        command=command,
+        requested_by=user,
+    )
+    job.set_options(options)
+    job.save()
+    return job
+
+
+def claim_next_job():
+    """Marks the oldest queued job as running and returns it, or None.
+
+    The conditional update means that if several workers are running, only
+    one of them claims each job.
+    """
+    queued = models.TransformJob.objects.filter(
+        status=models.TransformJob.QUEUED,
+    ).order_by('date_created', 'pk')
+
+    for job in queued:
+        now = timezone.now()
+        claimed = models.TransformJob.objects.filter(
+            pk=job.pk,
+            status=models.TransformJob.QUEUED,
+        ).update(
+            status=models.TransformJob.RUNNING,
+            date_started=now,
+            date_heartbeat=now,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+    return None
+
+
+def fail_stale_jobs(stale_after):
+    """Marks running jobs whose worker has not reported progress for longer
+    than stale_after as failed, returning the number of jobs.
+
+    A worker that is killed while running a job, e.g. running out of memory
+    or during a deploy, leaves the job running with nothing to finish it.
+    The transform commands report progress after each block of articles, so
+    stale_after should be well over the time a block takes. A job that is
+    slow rather than stopped ends at its next progress report and keeps the
+    failed status. Articles whose output is unchanged are skipped, so the
+    transform can be queued again.
+
+    :param stale_after: a datetime.timedelta
+    """
+    now = timezone.now()
+    return models.TransformJob.objects.filter(
+        status=models.TransformJob.RUNNING,
+        date_heartbeat__lt=now - stale_after,
+    ).update(
+        status=models.TransformJob.FAILED,
+        output=STALE_JOB_ERROR,
+        date_finished=now,
+    )
+
+
+def get_log_path(job):
+    """Returns the path of the file the output of a job is written to."""
+    return os.path.join(
+        settings.BASE_DIR,
+        "files",
+        "plugins",
+        "scripts",
+        "jobs",
+        f"{job.pk}.log",
+    )
+
+
+def run_job(job):
+    """Runs a claimed job, recording its summary and final status.
+
+    The full output of the command, including a message for every article,
+    is written to the job's log file rather than kept in memory, and only
+    the summary of the outcome is stored on the job.
+    """
+    log_path = get_log_path(job)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    command = None
+    error = ""
+    with open(log_path, "w") as log_file:
+        try:
+            command = load_command_class("plugins.scripts", job.command)
+            call_command(
+                command,
+                stdout=log_file,
+                stderr=log_file,
+                verbosity=2,
+                job_id=job.pk,
+                **job.get_options(),
+            )
+            status = models.TransformJob.COMPLETE
+        except Exception as e:
+            error = f"An error occurred: {str(e)}"
+            log_file.write(f"{error}\n{traceback.format_exc()}")
+            status = models.TransformJob.FAILED
+
+    # A job failed as stale by another worker keeps that status, as it may
+    # already have been queued again.
+    models.TransformJob.objects.filter(
+        pk=job.pk,
+        status=models.TransformJob.RUNNING,
+    ).update(
+        status=status,
+        output=error,
+        summary=json.dumps(getattr(command, "result", None) or {}),
+        date_finished=timezone.now(),
+    )
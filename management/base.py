@@ -0,0 +1,268 @@
+import argparse
+import functools
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from plugins.scripts import checkpoints, jats, models, profiling, transform
+
+
+class ProfiledCommand(BaseCommand):
+    """Base class for commands that report where their time goes.
+
+    Adds a --profile option to the command's own arguments. When given, the
+    command runs with a profiling.Profiler active and the time and queries
+    of each profiling.stage are written to stderr as a table or JSON once
+    it finishes, so they do not mix with output written to stdout.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            '--profile',
+            nargs='?',
+            const='table',
+            choices=['table', 'json'],
+            help='Reports the time, queries and memory of each stage of the '
+                 'command to stderr, as a table or JSON.',
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        profile_format = options.get('profile')
+        if not profile_format:
+            return super().execute(*args, **options)
+
+        with profiling.profile() as profiler:
+            try:
+                return super().execute(*args, **options)
+            finally:
+                profiler.finish()
+                if profile_format == 'json':
+                    self.stderr.write(profiler.format_json())
+                else:
+                    self.stderr.write(profiler.format_table())
+
+
+class JATSTransformCommand(ProfiledCommand):
+    """Base class for commands that write JATS galley content to Articles.
+
+    Subclasses implement get_mappings to return the jats.FieldMappings to
+    apply to each selected article.
+
+    Once handle has run, result holds the TransformSummary of the run as a
+    dict, or None if no articles were selected, for callers that run the
+    command with call_command and need more than its output.
+    """
+
+    result = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--journal-codes',
+            nargs='+',
+            type=str,
+            help='Journal codes to filter the articles.',
+        )
+        parser.add_argument(
+            '--article-id',
+            type=int,
+            help='Specific article ID to process.',
+        )
+        parser.add_argument(
+            '--issue-ids',
+            nargs='+',
+            type=int,
+            help='Issue IDs to filter the articles by associated issues.',
+        )
+        parser.add_argument(
+            '--test-run',
+            action='store_true',
+            help='Outputs the transformed values without saving.',
+        )
+        parser.add_argument(
+            '--full-parse',
+            action='store_true',
+            help='Parses the whole galley rather than stopping after <front>, '
+                 'so galleys that are not well-formed after <front> are '
+                 'counted as errors.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse and transform galleys.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of articles written per transaction.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of articles fetched from the database at a time.',
+        )
+        parser.add_argument(
+            '--engine',
+            choices=jats.ENGINES,
+            default=jats.XSLT_ENGINE,
+            help='Transforms elements with their XSLT, or with native rules '
+                 'that walk the element tree and give the same output.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Transforms articles even if their galley and XSLT are '
+                 'unchanged since the last run.',
+        )
+        parser.add_argument(
+            '--diff-file',
+            type=str,
+            help='Path to write each changed field to as JSON Lines.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continues from the last article committed by an earlier, '
+                 'interrupted run with the same selection.',
+        )
+        # Set by jobs.run_job to report progress to a TransformJob.
+        parser.add_argument(
+            '--job-id',
+            type=int,
+            help=argparse.SUPPRESS,
+        )
+
+    def get_mappings(self, options):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        journal_codes = options.get('journal_codes')
+        article_id = options.get('article_id')
+        issue_ids = options.get('issue_ids')
+        test_run = options.get('test_run', False)
+        full_parse = options.get('full_parse', False)
+        workers = options.get('workers') or 1
+        batch_size = options.get('batch_size') or 500
+        force = options.get('force', False)
+        chunk_size = options.get('chunk_size') or 500
+        job_id = options.get('job_id')
+        diff_file_path = options.get('diff_file')
+        verbose = options.get('verbosity', 1) > 1
+        resume = options.get('resume', False)
+        engine = options.get('engine') or jats.XSLT_ENGINE
+
+        mappings = self.get_mappings(options)
+        for mapping in mappings:
+            if not os.path.exists(mapping.xslt_file):
+                raise CommandError(f"XSLT file not found: {mapping.xslt_file}")
+            if engine == jats.NATIVE_ENGINE and mapping.native_rules is None:
+                raise CommandError(
+                    f"The native engine has no rules equivalent to "
+                    f"{mapping.xslt_file}, use --engine {jats.XSLT_ENGINE}."
+                )
+
+        if not (article_id or journal_codes or issue_ids):
+            self.stdout.write(self.style.ERROR(
+                'You must provide either --article-id, --journal-codes, or --issue-ids.'))
+            return
+
+        with profiling.stage('plan'):
+            article_ids = transform.plan_article_ids(
+                self.log,
+                journal_codes=journal_codes,
+                issue_ids=issue_ids,
+                article_id=article_id,
+            )
+        if article_ids is None:
+            return
+
+        command = self.__module__.rsplit('.', 1)[-1]
+        checkpoint_key = checkpoints.get_key({
+            'journal_codes': sorted(journal_codes or []),
+            'issue_ids': sorted(issue_ids or []),
+            'article_id': article_id,
+            'fields': sorted(mapping.name for mapping in mappings),
+        })
+        if resume:
+            position = checkpoints.get_position(command, checkpoint_key)
+            if position is not None:
+                self.log(f'Resuming after article ID {position}.')
+                article_ids = article_ids.filter(pk__gt=position)
+
+        checkpoint = None if test_run else functools.partial(
+            self.save_checkpoint,
+            command,
+            checkpoint_key,
+        )
+
+        if job_id:
+            models.TransformJob.objects.filter(pk=job_id).update(
+                total=article_ids.count(),
+                date_heartbeat=timezone.now(),
+            )
+        progress = functools.partial(
+            self.report_progress,
+            job_id,
+        ) if job_id else None
+
+        diff_file = open(diff_file_path, 'w') if diff_file_path else None
+        try:
+            runner = transform.TransformRunner(
+                mappings,
+                test_run=test_run,
+                streaming=not full_parse,
+                workers=workers,
+                batch_size=batch_size,
+                force=force,
+                block_size=chunk_size,
+                progress=progress,
+                diff_file=diff_file,
+                verbose=verbose,
+                log=self.log,
+                checkpoint=checkpoint,
+                engine=engine,
+            )
+            summary = runner.run(
+                transform.fetch_articles(article_ids, chunk_size=chunk_size),
+            )
+        finally:
+            if diff_file:
+                diff_file.close()
+
+        # After a failed save the checkpoint is kept for --resume to retry
+        # from.
+        if not test_run and not runner.save_failed:
+            checkpoints.clear(command, checkpoint_key)
+        self.result = summary.as_dict()
+        self.stdout.write(str(summary))
+
+    def save_checkpoint(self, command, checkpoint_key, article_pk):
+        with profiling.stage('checkpoint'):
+            checkpoints.save_position(command, checkpoint_key, article_pk)
+
+    def report_progress(self, job_id, processed):
+        with profiling.stage('progress'):
+            updated = models.TransformJob.objects.filter(
+                pk=job_id,
+                status=models.TransformJob.RUNNING,
+            ).update(
+                processed=processed,
+                date_heartbeat=timezone.now(),
+            )
+        # The job was failed as stale and may have been queued again.
+        if not updated:
+            raise CommandError(f'Job {job_id} is no longer running.')
+
+    def log(self, message, level='info'):
+        styles = {
+            'success': self.style.SUCCESS,
+            'warning': self.style.WARNING,
+            'error': self.style.ERROR,
+        }
+        style = styles.get(level)
+        self.stdout.write(style(message) if style else message)
@@ -0,0 +1,369 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core import models as core_models
+from journal import models as journal_models
+from submission import models as submission_models
+
+from plugins.scripts import benchmark, jats
+from plugins.scripts.management.base import ProfiledCommand
+
+
+BENCHMARK_JOURNAL_CODE = 'benchmark'
+
+# The commands run by --database, with their arguments.
+COMMANDS = [
+    (
+        'jats_title_to_html',
+        ['--xslt-file', jats.FIELD_MAPPINGS['title'].xslt_file],
+    ),
+    (
+        'jats_abstract_to_html',
+        ['--xslt-file', jats.FIELD_MAPPINGS['abstract'].xslt_file],
+    ),
+    ('jats_to_html', ['--fields', 'title', 'abstract']),
+]
+
+
+def format_mb(value):
+    return 'n/a' if value is None else '{:.1f}'.format(value / 1024 / 1024)
+
+
+class Command(ProfiledCommand):
+    """Benchmarks the JATS transform pipeline against a synthetic corpus."""
+
+    help = (
+        "Generates a synthetic JATS corpus and reports the throughput, "
+        "per-stage latency and peak memory of the title and abstract "
+        "transforms, optionally running the commands against a test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--galleys',
+            type=int,
+            default=200,
+            help='Number of galleys in the corpus.',
+        )
+        parser.add_argument(
+            '--large-ratio',
+            type=float,
+            default=0.1,
+            help='Share of the galleys that are large.',
+        )
+        parser.add_argument(
+            '--large-sections',
+            type=int,
+            default=benchmark.GALLEY_SIZES['large'],
+            help='Number of body sections in a large galley.',
+        )
+        parser.add_argument(
+            '--markup',
+            choices=['heavy', 'plain'],
+            default='heavy',
+            help='Whether titles, abstracts and body text contain nested '
+                 'inline markup.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for the corpus.',
+        )
+        parser.add_argument(
+            '--corpus-dir',
+            type=str,
+            help='Directory to write the corpus to and keep. A temporary '
+                 'directory is used and removed by default.',
+        )
+        parser.add_argument(
+            '--full-parse',
+            action='store_true',
+            help='Parses whole galleys rather than stopping after <front>.',
+        )
+        parser.add_argument(
+            '--engines',
+            nargs='+',
+            choices=jats.ENGINES,
+            default=jats.ENGINES,
+            help='Engines to benchmark, each is run against the same corpus.',
+        )
+        parser.add_argument(
+            '--no-trace-memory',
+            action='store_false',
+            dest='trace_memory',
+            help='Does not trace peak memory, which slows down the native '
+                 'engine more than the XSLT. Use when comparing engines.',
+        )
+        parser.add_argument(
+            '--database',
+            action='store_true',
+            help='Also runs the transform commands against the corpus in a '
+                 'test database, created and destroyed by the benchmark.',
+        )
+        parser.add_argument(
+            '--allow-server-database',
+            action='store_true',
+            help='Allows --database when the default database is not SQLite, '
+                 'creating the test database on the database server.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of workers used by the commands with --database.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['table', 'json'],
+            default='table',
+        )
+
+    def handle(self, *args, **options):
+        if options['galleys'] < 1:
+            raise CommandError('--galleys must be at least 1.')
+        if (
+            options['database']
+            and connection.vendor != 'sqlite'
+            and not options['allow_server_database']
+        ):
+            raise CommandError(
+                f'--database creates a test database on the {connection.vendor} '
+                f'server of the default database. Use --allow-server-database '
+                f'to allow this.'
+            )
+
+        corpus_dir = options.get('corpus_dir')
+        work_dir = tempfile.mkdtemp(prefix='jats-benchmark-')
+        try:
+            with benchmark.measure() as generated:
+                corpus = benchmark.generate_corpus(
+                    corpus_dir or os.path.join(work_dir, 'corpus'),
+                    options['galleys'],
+                    large_ratio=options['large_ratio'],
+                    markup=options['markup'],
+                    large_sections=options['large_sections'],
+                    seed=options['seed'],
+                )
+            report = {
+                'corpus': self.describe_corpus(corpus, generated),
+                'stages': self.run_stages(corpus, options),
+            }
+            if options['database']:
+                report['commands'] = self.run_commands(corpus, work_dir, options)
+        finally:
+            shutil.rmtree(work_dir)
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_table(report)
+
+    def describe_corpus(self, corpus, generated):
+        sizes = {}
+        for size, path in corpus:
+            counts = sizes.setdefault(size, {'galleys': 0, 'bytes': 0})
+            counts['galleys'] += 1
+            counts['bytes'] += os.path.getsize(path)
+        return {
+            'sizes': sizes,
+            'seconds': generated['seconds'],
+        }
+
+    def run_stages(self, corpus, options):
+        """Times each stage of extraction with each engine for the whole
+        corpus and for each size of galley."""
+        mappings = list(jats.FIELD_MAPPINGS.values())
+        streaming = not options['full_parse']
+        results = {}
+        groups = [('all', [path for _size, path in corpus])]
+        for size in benchmark.GALLEY_SIZES:
+            paths = [path for galley_size, path in corpus if galley_size == size]
+            if paths:
+                groups.append((size, paths))
+
+        for engine in options['engines']:
+            results[engine] = {}
+            for name, paths in groups:
+                results[engine][name] = self.run_group(
+                    paths,
+                    mappings,
+                    streaming,
+                    engine,
+                    options['trace_memory'],
+                )
+        return results
+
+    def run_group(self, paths, mappings, streaming, engine, trace_memory):
+        with benchmark.measure(trace_memory) as measured:
+            timer = benchmark.benchmark_stages(
+                paths,
+                mappings,
+                streaming=streaming,
+                engine=engine,
+            )
+        return {
+            'galleys': len(paths),
+            'seconds': measured['seconds'],
+            'galleys_per_second': len(paths) / measured['seconds'],
+            'peak_memory': measured['peak_memory'],
+            'max_rss': measured['max_rss'],
+            'stages': timer.stats(),
+        }
+
+    def run_commands(self, corpus, work_dir, options):
+        """Runs the transform commands against a test database.
+
+        Articles and galleys for the corpus are created in a fresh test
+        database. An existing database with the test database's name is
+        only deleted if confirmed. BASE_DIR is pointed at a temporary
+        directory so galley files are written outside the install. Each
+        command is run with each engine, and titles and abstracts are reset
+        before each run so each one writes every field.
+        """
+        old_name = connection.creation.create_test_db(
+            verbosity=0,
+            serialize=False,
+        )
+        try:
+            with override_settings(BASE_DIR=work_dir):
+                article_ids = self.create_articles(corpus)
+                return {
+                    engine: {
+                        name: self.run_command(
+                            name,
+                            args + ['--engine', engine],
+                            article_ids,
+                            options,
+                        )
+                        for name, args in COMMANDS
+                    }
+                    for engine in options['engines']
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_articles(self, corpus):
+        journal = journal_models.Journal.objects.create(
+            code=BENCHMARK_JOURNAL_CODE,
+            domain='benchmark.localhost',
+        )
+        article_ids = []
+        for _size, path in corpus:
+            article = submission_models.Article.objects.create(
+                journal=journal,
+                title='Benchmark',
+            )
+            file = core_models.File.objects.create(
+                mime_type='application/xml',
+                original_filename=os.path.basename(path),
+                uuid_filename=f'{uuid.uuid4()}.xml',
+                label='XML',
+                article_id=article.pk,
+            )
+            core_models.Galley.objects.create(
+                article=article,
+                file=file,
+                label='XML',
+                type='xml',
+            )
+            file_path = file.get_file_path(article)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            shutil.copyfile(path, file_path)
+            article_ids.append(article.pk)
+        return article_ids
+
+    def run_command(self, name, args, article_ids, options):
+        submission_models.Article.objects.filter(
+            pk__in=article_ids,
+        ).update(title='Benchmark', abstract='')
+
+        args = args + [
+            '--journal-codes', BENCHMARK_JOURNAL_CODE,
+            '--workers', str(options['workers']),
+            '--force',
+        ]
+        if options['full_parse']:
+            args.append('--full-parse')
+
+        with open(os.devnull, 'w') as devnull:
+            with CaptureQueriesContext(connection) as queries:
+                with benchmark.measure(options['trace_memory']) as measured:
+                    call_command(name, *args, stdout=devnull)
+        return {
+            'articles': len(article_ids),
+            'seconds': measured['seconds'],
+            'articles_per_second': len(article_ids) / measured['seconds'],
+            'queries': len(queries),
+            'peak_memory': measured['peak_memory'],
+            'max_rss': measured['max_rss'],
+        }
+
+    def write_table(self, report):
+        corpus = report['corpus']
+        self.stdout.write('Corpus, generated in {:.2f}s'.format(corpus['seconds']))
+        for size, counts in corpus['sizes'].items():
+            self.stdout.write('  {}: {} galleys, {:.1f} KB on average'.format(
+                size,
+                counts['galleys'],
+                counts['bytes'] / counts['galleys'] / 1024,
+            ))
+
+        for engine, groups in report['stages'].items():
+            for name, result in groups.items():
+                self.write_stages(engine, name, result)
+
+        if 'commands' in report:
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS('Commands against a test database'))
+            self.stdout.write('  {:<24}{:>8}{:>10}{:>14}{:>10}{:>12}{:>12}'.format(
+                'command', 'engine', 'seconds', 'articles/s', 'queries',
+                'peak MB', 'RSS MB',
+            ))
+            for engine, commands in report['commands'].items():
+                for name, result in commands.items():
+                    self.stdout.write('  {:<24}{:>8}{:>10.2f}{:>14.1f}{:>10}{:>12}{:>12}'.format(
+                        name,
+                        engine,
+                        result['seconds'],
+                        result['articles_per_second'],
+                        result['queries'],
+                        format_mb(result['peak_memory']),
+                        format_mb(result['max_rss']),
+                    ))
+
+    def write_stages(self, engine, name, result):
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            '{} galleys ({}), {} engine: {:.1f} galleys/s, peak traced '
+            'memory {} MB, max RSS {} MB'.format(
+                name.capitalize(),
+                result['galleys'],
+                engine,
+                result['galleys_per_second'],
+                format_mb(result['peak_memory']),
+                format_mb(result['max_rss']),
+            )
+        ))
+        self.stdout.write('  {:<16}{:>8}{:>12}{:>12}{:>12}{:>12}'.format(
+            'stage', 'calls', 'total s', 'mean ms', 'p50 ms', 'p95 ms',
+        ))
+        for stage, stats in result['stages'].items():
+            self.stdout.write(
+                '  {:<16}{:>8}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+                    stage,
+                    stats['calls'],
+                    stats['total'],
+                    stats['mean'] * 1000,
+                    stats['p50'] * 1000,
+                    stats['p95'] * 1000,
+                )
+            )
@@ -1,14 +1,23 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import StrIndex, Substr
 
 from review import models as review_models
 from journal import models as journal_models
 from submission.models import REVIEW_STAGES
 
+from plugins.scripts import profiling
+from plugins.scripts.management.base import ProfiledCommand
 
-class Command(BaseCommand):
+
+class Command(ProfiledCommand):
     """A management command to clean sections of OJS reviews."""
 
-    help = "Cleans editor text out of OJS reviews."
+    help = (
+        "Cleans editor text out of OJS reviews. The text after the separator "
+        "in each answer is moved to the assignment's comments for the editor."
+    )
 
     def add_arguments(self, parser):
         """ Adds arguments to Django's management command-line parser.
@@ -20,21 +29,47 @@ class Command(BaseCommand):
         parser.add_argument('separator')
         parser.add_argument('--article_id', default=False)
         parser.add_argument('--dryrun', action="store_true", default=False)
+        parser.add_argument(
+            '--engine',
+            choices=['database', 'python'],
+            default='database',
+            help='Split answers with set-based UPDATEs in the database, or '
+                 'in Python with a bulk update per batch.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of answers updated per batch by the python engine.',
+        )
 
     def handle(self, *args, **options):
         journal_code = options.get('journal_code')
         separator = str(options.get('separator'))
         article_id = options.get('article_id')
         dryrun = options.get('dryrun')
+        engine = options.get('engine')
+        batch_size = options.get('batch_size')
+
+        if not separator:
+            raise CommandError('The separator cannot be empty.')
 
         try:
             journal = journal_models.Journal.objects.get(code=journal_code)
-        except journal_models.Journal.objects.DoesNotExist:
-            exit('No journal with that code found.')
+        except journal_models.Journal.DoesNotExist:
+            raise CommandError('No journal with that code found.')
 
+        # Only answers that actually contain the separator are touched. The
+        # position is checked as well as the LIKE, which is case insensitive
+        # on some databases.
         review_form_answers = review_models.ReviewAssignmentAnswer.objects.filter(
             assignment__article__journal=journal,
-            assignment__article__stage__in=REVIEW_STAGES
+            assignment__article__stage__in=REVIEW_STAGES,
+            answer__contains=separator,
+        ).annotate(
+            separator_position=StrIndex('answer', Value(separator)),
+        ).filter(
+            separator_position__gt=0,
         )
 
         if article_id:
@@ -42,17 +77,87 @@ class Command(BaseCommand):
                 assignment__article_id=article_id,
             )
 
-        for review_answer in review_form_answers:
-            head, sep, tail = review_answer.answer.partition(separator)
-            review_answer.answer = head
-            review_answer.assignment.comments_for_editor = tail
-
-            if dryrun and (sep or tail):
+        if dryrun:
+            for review_answer in review_form_answers.select_related(
+                'assignment__article',
+            ):
                 print("Altering answer for article {}, assignment {}. found {}".format(
                     review_answer.assignment.article,
                     review_answer.assignment.pk,
                     separator
                 ))
+            return
+
+        with profiling.stage(f'clean_{engine}'):
+            if engine == 'database':
+                count = self.clean_in_database(review_form_answers, separator)
             else:
-                review_answer.save()
-                review_answer.assignment.save()
+                count = self.clean_in_python(review_form_answers, separator, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Cleaned {count} answers.'))
+
+    def clean_in_database(self, review_form_answers, separator):
+        """Splits every answer with two UPDATE statements.
+
+        The comments are set from the text after the separator before the
+        answers are truncated. Where an assignment has several matching
+        answers, the last one wins, as it did when saving them one by one.
+        """
+        tail = Substr(
+            'answer',
+            StrIndex('answer', Value(separator)) + len(separator),
+        )
+        last_tail = review_form_answers.filter(
+            assignment=OuterRef('pk'),
+        ).order_by('-pk').annotate(
+            tail=tail,
+        ).values('tail')[:1]
+
+        with transaction.atomic():
+            review_models.ReviewAssignment.objects.filter(
+                pk__in=review_form_answers.values('assignment_id'),
+            ).update(
+                comments_for_editor=Subquery(last_tail),
+            )
+            return review_form_answers.update(
+                answer=Substr(
+                    'answer',
+                    1,
+                    StrIndex('answer', Value(separator)) - 1,
+                ),
+            )
+
+    def clean_in_python(self, review_form_answers, separator, batch_size):
+        """Splits answers in Python, writing each batch with bulk_update."""
+        answer_ids = list(
+            review_form_answers.order_by('pk').values_list('pk', flat=True)
+        )
+
+        for start in range(0, len(answer_ids), batch_size):
+            with profiling.stage('fetch'):
+                batch = list(review_models.ReviewAssignmentAnswer.objects.filter(
+                    pk__in=answer_ids[start:start + batch_size],
+                ).select_related('assignment').order_by('pk'))
+
+            answers = []
+            assignments = {}
+            for review_answer in batch:
+                head, sep, tail = review_answer.answer.partition(separator)
+                if not sep:
+                    continue
+                review_answer.answer = head
+                review_answer.assignment.comments_for_editor = tail
+                answers.append(review_answer)
+                assignments[review_answer.assignment.pk] = review_answer.assignment
+
+            with profiling.stage('save'), transaction.atomic():
+                review_models.ReviewAssignmentAnswer.objects.bulk_update(
+                    answers,
+                    ['answer'],
+                )
+                review_models.ReviewAssignment.objects.bulk_update(
+                    assignments.values(),
+                    ['comments_for_editor'],
+                )
+
+        return len(answer_ids)
@@ -1,99 +1,175 @@
 # review/management/commands/export_reviews.py
 
-import csv
+import os
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
-from review.models import (
-    ReviewAssignment,
-    ReviewAssignmentAnswer,
-    ReviewFormElement,
-)
+from journal.models import Journal
+from plugins.scripts import models, profiling, reviews
+from plugins.scripts.management.base import ProfiledCommand
 
 
-class Command(BaseCommand):
-    help = "Export ReviewAssignments and their answers to CSV."
+class Command(ProfiledCommand):
+    help = (
+        "Export ReviewAssignments and their answers, writing one file per "
+        "journal from a single pass over the review tables."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--journal",
             type=str,
-            required=True,
-            help="Journal code to filter ReviewAssignments by",
+            nargs="+",
+            help="Journal codes to filter ReviewAssignments by",
         )
-
-    def handle(self, *args, **options):
-        journal_code = options["journal"]
-        filename = f"review_assignments_export_{journal_code}.csv"
-
-        assignments = ReviewAssignment.objects.filter(
-            article__journal__code=journal_code,
-        ).select_related(
-            "article",
-            "reviewer",
-            "editor",
+        parser.add_argument(
+            "--all-journals",
+            action="store_true",
+            help="Export the ReviewAssignments of every journal",
         )
-
-        if not assignments.exists():
-            self.stdout.write(self.style.WARNING(f"No review assignments found for journal '{journal_code}'"))
-            return
-
-        all_elements = ReviewFormElement.objects.filter(
-            id__in=ReviewAssignmentAnswer.objects.filter(
-                assignment__in=assignments,
-            ).values_list(
-                "original_element_id",
-                flat=True,
-            ).distinct()
+        parser.add_argument(
+            "--format",
+            choices=sorted(reviews.EXPORT_WRITERS),
+            default="csv",
+            help="Output format, CSV or JSON Lines",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress each output file with gzip",
+        )
+        parser.add_argument(
+            "--output-dir",
+            type=str,
+            default=".",
+            help="Directory to write the export files to",
+        )
+        parser.add_argument(
+            "--since",
+            type=str,
+            help="Only export assignments requested, accepted, declined or "
+                 "completed after this date or ISO 8601 datetime",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only export assignments that changed since each journal's "
+                 "last incremental export and record this export as the "
+                 "new starting point",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of assignments whose answers are fetched per query",
         )
 
-        element_headers = {
-            element.id: element.name or f"element_{element.id}"
-            for element in all_elements
-        }
-
-        fieldnames = [
-            "assignment_id",
-            "article_id",
-            "reviewer",
-            "editor",
-            "decision",
-            "date_requested",
-            "date_due",
-            "date_accepted",
-            "date_declined",
-            "date_complete",
-            "is_complete",
-        ] + list(element_headers.values())
-
-        with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for assignment in assignments:
-                row = {
-                    "assignment_id": assignment.id,
-                    "article_id": assignment.article_id,
-                    "reviewer": assignment.reviewer.full_name(),
-                    "editor": assignment.editor.full_name() if assignment.editor else '',
-                    "decision": assignment.decision,
-                    "date_requested": assignment.date_requested,
-                    "date_due": assignment.date_due,
-                    "date_accepted": assignment.date_accepted,
-                    "date_declined": assignment.date_declined,
-                    "date_complete": assignment.date_complete,
-                    "is_complete": assignment.is_complete,
-                }
-
-                answers = ReviewAssignmentAnswer.objects.filter(
-                    assignment=assignment
+    def handle(self, *args, **options):
+        journal_codes = options["journal"]
+        # call_command passes keyword options as given, so callers of the
+        # earlier single code option pass a string.
+        if isinstance(journal_codes, str):
+            journal_codes = [journal_codes]
+        export_format = options["format"]
+        compress = options["gzip"]
+        output_dir = options["output_dir"]
+        chunk_size = options["chunk_size"]
+        incremental = options["incremental"]
+        since = self.parse_since(options["since"]) if options["since"] else None
+
+        if options["all_journals"]:
+            journal_codes = list(
+                Journal.objects.order_by("code").values_list("code", flat=True)
+            )
+        elif not journal_codes:
+            raise CommandError("Provide --journal or --all-journals.")
+
+        journals = Journal.objects.filter(code__in=journal_codes)
+        since_by_journal = {journal.code: since for journal in journals}
+        if incremental and not since:
+            since_by_journal = {
+                watermark.journal.code: watermark.last_exported
+                for watermark in models.ReviewExportWatermark.objects.filter(
+                    journal__in=journals,
+                ).select_related("journal")
+            }
+
+        # Taken before the export starts, so anything changing while it runs
+        # is included in the next export.
+        export_started = timezone.now()
+        assignments = reviews.get_assignments(
+            journal_codes,
+            since=since_by_journal,
+        )
+        with profiling.stage("headers"):
+            headers_by_journal = reviews.get_element_headers_by_journal(assignments)
+        element_headers = {}
+        for journal_headers in headers_by_journal.values():
+            element_headers.update(journal_headers)
+
+        # Assignments are ordered by journal, so only one file is open at a
+        # time and each is finished before the next is started.
+        exported = {}
+        current_code = export_file = writer = None
+        try:
+            for assignment, row in reviews.iter_assignment_rows(
+                assignments,
+                element_headers,
+                chunk_size=chunk_size,
+            ):
+                journal_code = assignment.article.journal.code
+                if journal_code != current_code:
+                    if export_file:
+                        export_file.close()
+                    current_code = journal_code
+                    filename = os.path.join(
+                        output_dir,
+                        reviews.get_filename(journal_code, export_format, compress),
+                    )
+                    export_file = reviews.open_export_file(filename, compress)
+                    writer = reviews.EXPORT_WRITERS[export_format](
+                        export_file,
+                        reviews.get_fieldnames(
+                            headers_by_journal.get(journal_code, {}),
+                        ),
+                    )
+                    exported[journal_code] = [filename, 0]
+
+                with profiling.stage("write"):
+                    writer.write(row)
+                exported[journal_code][1] += 1
+        finally:
+            if export_file:
+                export_file.close()
+
+        if incremental:
+            for journal in journals:
+                models.ReviewExportWatermark.objects.update_or_create(
+                    journal=journal,
+                    defaults={"last_exported": export_started},
                 )
 
-                for answer in answers:
-                    header = element_headers.get(answer.original_element_id)
-                    if header:
-                        row[header] = answer.edited_answer or answer.answer
-
-                writer.writerow(row)
-
-        self.stdout.write(self.style.SUCCESS(f"Exported data to {filename}"))
+        for journal_code in journal_codes:
+            changed = ""
+            if since_by_journal.get(journal_code):
+                changed = f" changed since {since_by_journal[journal_code].isoformat()}"
+            if journal_code in exported:
+                filename, count = exported[journal_code]
+                self.stdout.write(self.style.SUCCESS(
+                    f"Exported {count} assignments{changed} to {filename}"))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"No review assignments{changed} found for journal '{journal_code}'"))
+
+    def parse_since(self, value):
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f"Invalid --since value: {value}")
+            since = timezone.datetime(date.year, date.month, date.day)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
@@ -1,37 +1,217 @@
-import random
+import queue
+import threading
+
 from tqdm import tqdm
-from faker import Faker
-from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection, transaction
 from submission.models import Article, FrozenAuthor
 from core.models import Account
 
+from plugins.scripts import profiling, pseudonyms
+from plugins.scripts.management.base import ProfiledCommand
+
 
-class Command(BaseCommand):
+class Command(ProfiledCommand):
     help = "Randomise titles for Articles and names for FrozenAuthors and Accounts"
 
     EXCLUDED_EMAILS = {"olh-tech@bbk.ac.uk", "a.byers@bbk.ac.uk", "tech@openlibhums.org"}
 
-    def handle(self, *args, **kwargs):
-        fake = Faker()
-
-        self.stdout.write(self.style.SUCCESS("Updating Article titles..."))
-        articles = Article.objects.all()
-        for article in tqdm(articles, desc="Updating Articles"):
-            article.title = fake.sentence()
-            article.save(update_fields=["title"])
-
-        self.stdout.write(self.style.SUCCESS("Updating FrozenAuthor names..."))
-        authors = FrozenAuthor.objects.all()
-        for author in tqdm(authors, desc="Updating FrozenAuthors"):
-            author.first_name = fake.first_name()
-            author.last_name = fake.last_name()
-            author.save(update_fields=["first_name", "last_name"])
-
-        self.stdout.write(self.style.SUCCESS("Updating Account names..."))
-        accounts = Account.objects.exclude(email__in=self.EXCLUDED_EMAILS)
-        for account in tqdm(accounts, desc="Updating Accounts"):
-            account.first_name = fake.first_name()
-            account.last_name = fake.last_name()
-            account.save(update_fields=["first_name", "last_name"])
-
-        self.stdout.write(self.style.SUCCESS("Successfully updated all records."))
\ No newline at end of file
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of threads writing chunks to the database.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of rows updated per transaction.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Seed for reproducible pseudonyms.',
+        )
+        parser.add_argument(
+            '--key',
+            type=str,
+            help='Secret used to map each original name or title to the same '
+                 'pseudonym, so Accounts and FrozenAuthors stay consistent. '
+                 'Runs with the same key give the same pseudonyms.',
+        )
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            default=pseudonyms.POOL_SIZE,
+            help='Number of names and words generated for the pseudonym pools.',
+        )
+
+    def get_targets(self):
+        return [
+            (Article, Article.objects.all(), ["title"]),
+            (FrozenAuthor, FrozenAuthor.objects.all(), ["first_name", "last_name"]),
+            (
+                Account,
+                Account.objects.exclude(email__in=self.EXCLUDED_EMAILS),
+                ["first_name", "last_name"],
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        workers = options.get('workers') or 1
+        chunk_size = options.get('chunk_size') or 1000
+        if workers < 1 or chunk_size < 1:
+            raise CommandError('--workers and --chunk-size must be at least 1.')
+
+        with profiling.stage('build_pools'):
+            generator = pseudonyms.PseudonymGenerator(
+                seed=options.get('seed'),
+                key=options.get('key'),
+                pool_size=options.get('pool_size') or pseudonyms.POOL_SIZE,
+            )
+
+        targets = self.get_targets()
+        total = 0
+        for model, queryset, fields in targets:
+            count = queryset.count()
+            total += count
+            self.stdout.write(self.style.SUCCESS(
+                f"Updating {count} {model.__name__} {', '.join(fields)}..."
+            ))
+
+        progress = tqdm(total=total, desc="Updating records")
+        try:
+            if workers == 1:
+                for task in self.iter_tasks(targets, chunk_size):
+                    progress.update(self.update_chunk(generator, *task))
+            else:
+                self.run_threaded(
+                    generator,
+                    targets,
+                    chunk_size,
+                    workers,
+                    progress,
+                )
+        finally:
+            progress.close()
+
+        self.stdout.write(self.style.SUCCESS("Successfully updated all records."))
+
+    def iter_tasks(self, targets, chunk_size):
+        """Pages through the primary keys of each target in chunks.
+
+        Each page is a separate keyset query, so no cursor is left open
+        while the workers write.
+
+        :return: an iterator of (model, fields, pks, index) tuples, where
+            index counts the chunks of each model
+        """
+        for model, queryset, fields in targets:
+            index = 0
+            last_pk = None
+            while True:
+                page = queryset.order_by('pk')
+                if last_pk is not None:
+                    page = page.filter(pk__gt=last_pk)
+                with profiling.stage('read_pks'):
+                    pks = list(page.values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                yield model, fields, pks, index
+                index += 1
+                last_pk = pks[-1]
+
+    def update_chunk(self, generator, model, fields, pks, index):
+        """Writes new values to a chunk of rows with a single bulk_update.
+
+        Random pseudonyms do not depend on the rows, which are not read:
+        unsaved instances carrying only the primary key and the new values
+        are enough for bulk_update. Keyed pseudonyms are derived from the
+        original values, so those are read first.
+        """
+        if generator.key:
+            with profiling.stage('read_values'):
+                rows = list(model.objects.filter(
+                    pk__in=pks,
+                ).values_list('pk', *fields))
+            objects = [
+                model(
+                    pk=row[0],
+                    **{
+                        field: generator.keyed_value(field, original)
+                        for field, original in zip(fields, row[1:])
+                    }
+                )
+                for row in rows
+            ]
+        else:
+            with profiling.stage('generate'):
+                values = {
+                    field: generator.random_values(
+                        field,
+                        len(pks),
+                        stream=(model.__name__, field, index),
+                    )
+                    for field in fields
+                }
+            objects = [
+                model(
+                    pk=pk,
+                    **{field: values[field][i] for field in fields}
+                )
+                for i, pk in enumerate(pks)
+            ]
+        with profiling.stage('update'), transaction.atomic():
+            model.objects.bulk_update(objects, fields)
+        return len(objects)
+
+    def run_threaded(self, generator, targets, chunk_size, workers, progress):
+        """Shares chunks from all targets between a pool of threads.
+
+        Each thread has its own database connection, and closes it once the
+        queue is drained. Values depend on the chunk rather than the thread,
+        so a seeded run gives the same result with any number of workers.
+        The queue is bounded so primary keys are only read slightly ahead of
+        the workers.
+        """
+        tasks = queue.Queue(maxsize=workers * 2)
+        errors = []
+        lock = threading.Lock()
+
+        def work():
+            try:
+                with profiling.watch_queries():
+                    while True:
+                        task = tasks.get()
+                        if task is None:
+                            return
+                        if errors:
+                            continue
+                        try:
+                            count = self.update_chunk(generator, *task)
+                        except Exception as e:
+                            errors.append(e)
+                            continue
+                        with lock:
+                            progress.update(count)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for task in self.iter_tasks(targets, chunk_size):
+                if errors:
+                    break
+                tasks.put(task)
+        finally:
+            for _ in threads:
+                tasks.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
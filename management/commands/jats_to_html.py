@@ -0,0 +1,46 @@
+from django.core.management.base import CommandError
+
+from plugins.scripts import jats
+from plugins.scripts.management.base import JATSTransformCommand
+
+
+class Command(JATSTransformCommand):
+    help = (
+        "Transforms several Article fields from their JATS galley in a single "
+        "pass, parsing each galley and saving each article once. Supports "
+        "filtering by journal codes, issue IDs, or specific article ID."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--fields',
+            nargs='+',
+            type=str,
+            choices=list(jats.FIELD_MAPPINGS),
+            default=list(jats.FIELD_MAPPINGS),
+            help='Fields to transform, defaults to all available fields.',
+        )
+        parser.add_argument(
+            '--xslt-file',
+            nargs=2,
+            action='append',
+            metavar=('FIELD', 'PATH'),
+            help='Overrides the XSLT file used for a field, may be repeated.',
+        )
+
+    def get_mappings(self, options):
+        overrides = dict(options.get('xslt_file') or [])
+        unknown = set(overrides) - set(options['fields'])
+        if unknown:
+            raise CommandError(
+                f"XSLT override given for unselected field(s): {', '.join(sorted(unknown))}"
+            )
+
+        mappings = []
+        for name in dict.fromkeys(options['fields']):
+            mapping = jats.FIELD_MAPPINGS[name]
+            if name in overrides:
+                mapping = mapping.with_xslt_file(overrides[name])
+            mappings.append(mapping)
+        return mappings
@@ -1,12 +1,78 @@
-from django.core.management.base import BaseCommand
+import csv
+import io
+import json
 
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core import files
+from core.models import AccountRole
 from journal import models
+from review.models import ReviewAssignment
+from submission.models import Article
+
+from plugins.scripts import profiling
+from plugins.scripts.management.base import ProfiledCommand
+
+
+INVENTORY_FIELDNAMES = [
+    'code',
+    'articles',
+    'articles_with_xml_galleys',
+    'review_assignments',
+    'users',
+]
+
+
+def count_subquery(queryset, journal_field, count_field='pk'):
+    """Returns a subquery counting the rows of queryset for each journal.
+
+    Counting in a subquery per column, rather than joining every table to
+    the journal, keeps one count from multiplying another.
 
+    :param queryset: the rows to count
+    :param journal_field: the lookup from the rows to their journal
+    :param count_field: the field counted, distinct values only
+    """
+    counts = queryset.filter(
+        **{journal_field: OuterRef('pk')},
+    ).order_by().values(
+        journal_field,
+    ).annotate(
+        count=Count(count_field, distinct=True),
+    ).values('count')
+    return Coalesce(
+        Subquery(counts, output_field=IntegerField()),
+        0,
+    )
 
-class Command(BaseCommand):
-    """Lists journal names, codes or domains"""
 
-    help = "Utility to list all of the journal names, codes or domains"
+def get_inventory():
+    """Returns a dict of counts for each journal from a single query."""
+    return models.Journal.objects.order_by('code').annotate(
+        articles=count_subquery(Article.objects.all(), 'journal'),
+        articles_with_xml_galleys=count_subquery(
+            Article.objects.filter(
+                galley__file__mime_type__in=files.XML_MIMETYPES,
+            ),
+            'journal',
+        ),
+        review_assignments=count_subquery(
+            ReviewAssignment.objects.all(),
+            'article__journal',
+        ),
+        users=count_subquery(AccountRole.objects.all(), 'journal', 'user'),
+    ).values(*INVENTORY_FIELDNAMES)
+
+
+class Command(ProfiledCommand):
+    """Lists journal names, codes or domains, or an inventory of journals"""
+
+    help = (
+        "Utility to list all of the journal names, codes or domains, or an "
+        "inventory of the articles, XML galleys, review assignments and "
+        "users of each journal"
+    )
 
     def add_arguments(self, parser):
         """ Adds arguments to Django's management command-line parser.
@@ -15,13 +81,21 @@ class Command(BaseCommand):
         :return: None
         """
         parser.add_argument('list_type')
-        parser.add_argument('display_type')
+        parser.add_argument('display_type', nargs='?', default='multi')
+        parser.add_argument(
+            '--format',
+            choices=['table', 'json', 'csv'],
+            default='table',
+            help='Output format of the inventory.',
+        )
 
     def handle(self, *args, **options):
         list_type = options.get('list_type')
         display_type = options.get('display_type')
-        if list_type not in ['names', 'codes', 'domains']:
-            print('List Type must be either names, codes or domains')
+        if list_type == 'inventory':
+            self.write_inventory(options.get('format'))
+        elif list_type not in ['names', 'codes', 'domains']:
+            print('List Type must be either names, codes, domains or inventory')
         elif display_type not in ['one', 'multi']:
             print('Display Type must be one (one line) or multi (multiple lines)')
         else:
@@ -40,3 +114,28 @@ class Command(BaseCommand):
             else:
                 for line in out:
                     print(line)
+
+    def write_inventory(self, output_format):
+        with profiling.stage('inventory'):
+            rows = list(get_inventory())
+
+        if output_format == 'json':
+            self.stdout.write(json.dumps(rows, indent=2))
+        elif output_format == 'csv':
+            output = io.StringIO()
+            writer = csv.DictWriter(output, fieldnames=INVENTORY_FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+            self.stdout.write(output.getvalue(), ending='')
+        else:
+            widths = {
+                field: max(
+                    [len(field)] + [len(str(row[field])) for row in rows]
+                )
+                for field in INVENTORY_FIELDNAMES
+            }
+            for row in [dict(zip(INVENTORY_FIELDNAMES, INVENTORY_FIELDNAMES))] + rows:
+                self.stdout.write('  '.join(
+                    str(row[field]).ljust(widths[field])
+                    for field in INVENTORY_FIELDNAMES
+                ).rstrip())
@@ -1,7 +1,8 @@
 import csv
+import itertools
+import os
 import uuid
 
-from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.db import transaction, IntegrityError
 from django.utils import timezone
@@ -9,6 +10,9 @@ from django.utils import timezone
 from core.models import AccountRole, Role
 from journal.models import Journal
 
+from plugins.scripts import checkpoints, profiling
+from plugins.scripts.management.base import ProfiledCommand
+
 User = get_user_model()
 
 # Map CSV headers to Janeway Role slugs
@@ -25,7 +29,16 @@ CSV_ROLE_FIELD_MAP = {
 }
 
 
-class Command(BaseCommand):
+def normalise_account_fields(email, username):
+    """Returns an email and username as Account.save stores them.
+
+    bulk_create skips Account.save, so both imports normalise the CSV values
+    before looking accounts up or creating them, and give the same result.
+    """
+    return User.objects.normalize_email(email), username.lower()
+
+
+class Command(ProfiledCommand):
     help = "Import accounts from a CSV and assign roles."
 
     def add_arguments(self, parser):
@@ -49,12 +62,34 @@ class Command(BaseCommand):
             action='store_true',
             help='Show actions without saving.',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Import rows in chunks with a few set-based queries per '
+                 'chunk rather than several queries per row.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of CSV rows imported per chunk in bulk mode, and '
+                 'between checkpoints.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continues from the last row offset recorded by an earlier, '
+                 'interrupted import of the same file into the same journal.',
+        )
 
     def handle(self, *args, **options):
         csv_path = options['csv_path']
         journal_code = options['journal_code']
         activate_accounts = options['activate_accounts']
         dry_run = options['dry_run']
+        bulk = options.get('bulk', False)
+        chunk_size = options.get('chunk_size') or 1000
+        resume = options.get('resume', False)
 
         try:
             journal = Journal.objects.get(code=journal_code)
@@ -64,6 +99,15 @@ class Command(BaseCommand):
 
         roles_by_slug = {r.slug: r for r in Role.objects.all()}
 
+        command = 'ojs_user_csv_import'
+        checkpoint_key = checkpoints.get_key({
+            'csv_path': os.path.abspath(csv_path),
+            'journal_code': journal_code,
+        })
+        offset = 0
+        if resume:
+            offset = checkpoints.get_position(command, checkpoint_key) or 0
+
         with open(csv_path, newline='') as csvfile:
             reader = csv.DictReader(csvfile)
 
@@ -76,13 +120,45 @@ class Command(BaseCommand):
             if dry_run:
                 self.stdout.write(self.style.WARNING("Running in dry-run mode. No changes will be saved."))
 
-            for row in reader:
+            if offset:
+                self.stdout.write(f"Resuming after row {offset}.")
+                reader = itertools.islice(reader, offset, None)
+
+            if bulk:
+                while True:
+                    rows = list(itertools.islice(reader, chunk_size))
+                    if not rows:
+                        break
+                    with profiling.stage('import_chunk'):
+                        self.import_chunk(
+                            rows,
+                            journal,
+                            roles_by_slug,
+                            mapped_role_fields,
+                            activate_accounts,
+                            dry_run,
+                        )
+                    offset += len(rows)
+                    if not dry_run:
+                        checkpoints.save_position(command, checkpoint_key, offset)
+                if not dry_run:
+                    checkpoints.clear(command, checkpoint_key)
+                self.stdout.write(self.style.SUCCESS("Import complete."))
+                return
+
+            for offset, row in enumerate(reader, start=offset):
+                # Rows are saved as they are read, so every row before this
+                # one has been committed.
+                if offset and offset % chunk_size == 0 and not dry_run:
+                    checkpoints.save_position(command, checkpoint_key, offset)
+
                 email = row.get('Email')
                 username = row.get('Username') or email
 
                 if not email:
                     self.stderr.write(self.style.ERROR("Row without Email detected; skipping."))
                     continue
+                email, username = normalise_account_fields(email, username)
 
                 user = None
                 created = False
@@ -90,7 +166,7 @@ class Command(BaseCommand):
                 if dry_run:
                     user_qs = User.objects.filter(email=email)
                     if not user_qs.exists():
-                        user_qs = User.objects.filter(username=email)
+                        user_qs = User.objects.filter(username=email.lower())
 
                     if user_qs.exists():
                         user = user_qs.first()
@@ -114,7 +190,7 @@ class Command(BaseCommand):
                     except IntegrityError:
                         user_qs = User.objects.filter(email=email)
                         if not user_qs.exists():
-                            user_qs = User.objects.filter(username=email)
+                            user_qs = User.objects.filter(username=email.lower())
 
                         if user_qs.exists():
                             user = user_qs.first()
@@ -148,4 +224,138 @@ class Command(BaseCommand):
                                 if role_created:
                                     self.stdout.write(f"Assigned role '{role.name}' to {email}.")
 
+        if not dry_run:
+            checkpoints.clear(command, checkpoint_key)
         self.stdout.write(self.style.SUCCESS("Import complete."))
+
+    def import_chunk(
+        self,
+        rows,
+        journal,
+        roles_by_slug,
+        mapped_role_fields,
+        activate_accounts,
+        dry_run,
+    ):
+        """Imports a chunk of CSV rows with a fixed number of queries.
+
+        Existing users are resolved by email and then, as in the row by row
+        import, by a username equal to the email. Missing users and roles
+        are created with bulk_create, ignoring conflicts, and existing
+        inactive users are activated with a single update. Users created
+        this way do not go through Account.save, so their fields are
+        normalised with normalise_account_fields instead.
+        """
+        rows_by_email = {}
+        usernames = {}
+        for row in rows:
+            email = row.get('Email')
+            if not email:
+                self.stderr.write(self.style.ERROR("Row without Email detected; skipping."))
+                continue
+            email, username = normalise_account_fields(
+                email,
+                row.get('Username') or email,
+            )
+            rows_by_email.setdefault(email, []).append(row)
+            usernames.setdefault(email, username)
+
+        users = {
+            user.email: user
+            for user in User.objects.filter(email__in=rows_by_email)
+        }
+        unresolved = {
+            email.lower(): email
+            for email in rows_by_email if email not in users
+        }
+        if unresolved:
+            for user in User.objects.filter(username__in=unresolved):
+                users[unresolved[user.username]] = user
+
+        existing = dict(users)
+        new_users = []
+        for email, email_rows in rows_by_email.items():
+            if email in users:
+                continue
+            if dry_run:
+                self.stdout.write(self.style.NOTICE(f"Would create user: {email}"))
+                continue
+            row = email_rows[0]
+            new_users.append(User(
+                email=email,
+                username=usernames[email],
+                first_name=row.get('First Name', ''),
+                last_name=row.get('Last Name', ''),
+                date_joined=timezone.now(),
+                uuid=uuid.uuid4(),
+                is_active=activate_accounts,
+            ))
+
+        with transaction.atomic():
+            if new_users:
+                User.objects.bulk_create(new_users, ignore_conflicts=True)
+                for user in User.objects.filter(
+                    email__in=[user.email for user in new_users],
+                ):
+                    users[user.email] = user
+                    self.stdout.write(self.style.SUCCESS(f"Created user: {user.email}"))
+                # As in the row by row import, a conflicting username is
+                # resolved to the user with a username equal to the email.
+                conflicts = {
+                    user.email.lower(): user.email
+                    for user in new_users if user.email not in users
+                }
+                if conflicts:
+                    for user in User.objects.filter(username__in=conflicts):
+                        users[conflicts[user.username]] = user
+                for user in new_users:
+                    if user.email not in users:
+                        self.stderr.write(self.style.ERROR(f"IntegrityError but no matching user found for {user.email}. Skipping."))
+
+            if activate_accounts:
+                inactive = {
+                    email: user for email, user in existing.items()
+                    if not user.is_active
+                }
+                if inactive and not dry_run:
+                    User.objects.filter(
+                        pk__in=[user.pk for user in inactive.values()],
+                    ).update(is_active=True)
+                for email in inactive:
+                    self.stdout.write(self.style.SUCCESS(f"Activated user: {email}"))
+
+            wanted = {}
+            for email, email_rows in rows_by_email.items():
+                user = users.get(email)
+                if not user:
+                    continue
+                for row in email_rows:
+                    for csv_field, role_slug in mapped_role_fields.items():
+                        if row.get(csv_field, '').strip().lower() != 'yes':
+                            continue
+                        role = roles_by_slug.get(role_slug)
+                        if role:
+                            wanted[(user.pk, role.pk)] = (email, role)
+
+            assigned = set(
+                AccountRole.objects.filter(
+                    journal=journal,
+                    user_id__in={user_id for user_id, _ in wanted},
+                ).values_list('user_id', 'role_id')
+            ) if wanted else set()
+
+            new_roles = []
+            for (user_id, role_id), (email, role) in wanted.items():
+                if (user_id, role_id) in assigned:
+                    continue
+                if dry_run:
+                    self.stdout.write(f"Would assign role '{role.name}' to {email}.")
+                    continue
+                new_roles.append(AccountRole(
+                    user_id=user_id,
+                    journal=journal,
+                    role=role,
+                ))
+                self.stdout.write(f"Assigned role '{role.name}' to {email}.")
+            if new_roles:
+                AccountRole.objects.bulk_create(new_roles, ignore_conflicts=True)
@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+
+from plugins.scripts import jobs
+from plugins.scripts.management.base import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    """Runs transform jobs queued from the scripts manager."""
+
+    help = "Runs queued transform jobs in the background of the web server."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Runs the jobs currently queued and exits.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Seconds to wait between checks for new jobs.',
+        )
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=60,
+            help='Fails running jobs that have not reported progress for '
+                 'this many minutes, e.g. after their worker was killed.',
+        )
+
+    def handle(self, *args, **options):
+        once = options.get('once')
+        interval = options.get('interval')
+        stale_after = timedelta(minutes=options.get('stale_minutes'))
+
+        while True:
+            failed = jobs.fail_stale_jobs(stale_after)
+            if failed:
+                self.stdout.write(f'Failed {failed} stale job(s).')
+
+            job = jobs.claim_next_job()
+            if job:
+                self.stdout.write(f'Running job {job.pk}: {job}')
+                jobs.run_job(job)
+                continue
+
+            if once:
+                break
+            time.sleep(interval)
@@ -1,10 +1,23 @@
-from django.core.management.base import BaseCommand
+import csv
 
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from core import models as core_models
 from journal import models as journal_models
-from utils import setting_handler
+from utils import shared
+
+from plugins.scripts import profiling
+from plugins.scripts.management.base import ProfiledCommand
+
+
+# Columns of the file read by --file. journals is a space separated list of
+# journal codes or "all".
+FILE_FIELDNAMES = ['group', 'name', 'value', 'journals']
 
 
-class Command(BaseCommand):
+class Command(ProfiledCommand):
     """A management command to update settings."""
 
     help = "Updates settings for a given set of journals with the provided value."
@@ -15,36 +28,149 @@ class Command(BaseCommand):
         :param parser: the parser to which the required arguments will be added
         :return: None
         """
-        parser.add_argument('setting_group')
-        parser.add_argument('setting_name')
+        parser.add_argument('setting_group', nargs='?')
+        parser.add_argument('setting_name', nargs='?')
         parser.add_argument('-va', '--value')
         parser.add_argument('-c', '--codes',
                             nargs='+',
                             )
+        parser.add_argument(
+            '-f', '--file',
+            help='CSV file with group, name, value and journals columns, '
+                 'where journals is a space separated list of journal codes '
+                 'or "all". Boolean settings take "on" or an empty value.',
+        )
 
     def handle(self, *args, **options):
         setting_group_name = options.get('setting_group')
         setting_name = options.get('setting_name')
         journal_codes = options.get('codes')
         value = options.get('value')
+        file_path = options.get('file')
+
+        if file_path:
+            entries = self.read_entries(file_path)
+        elif setting_group_name and setting_name and journal_codes:
+            entries = [
+                (setting_group_name, setting_name, value, journal_codes),
+            ]
+        else:
+            raise CommandError(
+                'Provide a setting group, setting name and --codes, or --file.'
+            )
 
-        journals = journal_models.Journal.objects.filter(
-            code__in=journal_codes,
+        self.update_settings(entries)
+
+    def read_entries(self, file_path):
+        """Reads (group, name, value, journal codes) entries from a CSV file.
+
+        Journal codes are None where the entry applies to every journal.
+        """
+        entries = []
+        with open(file_path, newline='') as csv_file:
+            reader = csv.DictReader(csv_file)
+            missing = set(FILE_FIELDNAMES) - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(
+                    'The file is missing the columns: {}'.format(
+                        ', '.join(sorted(missing)),
+                    )
+                )
+            for row in reader:
+                journals = row['journals'].split()
+                entries.append((
+                    row['group'],
+                    row['name'],
+                    row['value'],
+                    None if journals == ['all'] else journals,
+                ))
+        return entries
+
+    def update_settings(self, entries):
+        """Saves every entry in one transaction.
+
+        Settings and journals are each fetched in a single query and the
+        existing values of each setting in one more, rather than looked up
+        for every journal. Values that already match are not saved, and the
+        cache is cleared once all of the values are written.
+        """
+        journals = journal_models.Journal.objects.all()
+        codes = {
+            code for _group, _name, _value, entry_codes in entries
+            for code in entry_codes or []
+        }
+        every_journal = any(
+            entry_codes is None for _group, _name, _value, entry_codes in entries
         )
+        if not every_journal:
+            journals = journals.filter(code__in=codes)
+        journals_by_code = {journal.code: journal for journal in journals}
+        for code in sorted(codes - set(journals_by_code)):
+            self.stderr.write(self.style.WARNING(f'No journal with code {code}.'))
 
-        for journal in journals:
-            old_setting = setting_handler.get_setting(
-                setting_group_name=setting_group_name,
-                setting_name=setting_name,
-                journal=journal,
-                default=True,
-            ).processed_value
-            setting_handler.save_setting(
-                setting_group_name=setting_group_name,
-                setting_name=setting_name,
-                journal=journal,
-                value=value,
+        setting_filter = Q()
+        for group, name, _value, _codes in entries:
+            setting_filter |= Q(group__name=group, name=name)
+        settings = {
+            (setting.group.name, setting.name): setting
+            for setting in core_models.Setting.objects.filter(
+                setting_filter,
+            ).select_related('group')
+        }
+        for group, name, _value, _codes in entries:
+            if (group, name) not in settings:
+                raise CommandError(f'No setting {name} in group {group}.')
+
+        with profiling.stage('save'), transaction.atomic():
+            for group, name, value, entry_codes in entries:
+                setting = settings[(group, name)]
+                if entry_codes is None:
+                    entry_journals = list(journals_by_code.values())
+                else:
+                    entry_journals = [
+                        journals_by_code[code] for code in entry_codes
+                        if code in journals_by_code
+                    ]
+                self.update_setting(setting, entry_journals, value)
+
+        with profiling.stage('clear_cache'):
+            shared.clear_cache()
+
+    def update_setting(self, setting, journals, value):
+        values = {
+            setting_value.journal_id: setting_value
+            for setting_value in core_models.SettingValue.objects.filter(
+                Q(journal__in=journals) | Q(journal__isnull=True),
+                setting=setting,
             )
+        }
+        default = values.get(None)
+
+        # Matches the conversion in setting_handler.save_setting.
+        if setting.types == 'boolean':
+            value = 'on' if value else ''
+
+        for journal in journals:
+            setting_value = values.get(journal.pk)
+            old_setting = setting_value or default
+            old_setting = old_setting.processed_value if old_setting else None
+
+            if setting_value and setting_value.value == value:
+                print(
+                    'Skipping {}. Setting value is already {}'.format(
+                        journal.name,
+                        old_setting,
+                    )
+                )
+                continue
+
+            if not setting_value:
+                setting_value = core_models.SettingValue(
+                    setting=setting,
+                    journal=journal,
+                )
+            setting_value.value = value
+            setting_value.save()
 
             print(
                 'Updating {}. Old setting value {}, new setting value {}'.format(
@@ -53,5 +179,3 @@ class Command(BaseCommand):
                     value,
                 )
             )
-
-
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('submission', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransformManifest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=255)),
+                ('galley_path', models.TextField()),
+                ('galley_mtime', models.FloatField()),
+                ('galley_hash', models.CharField(max_length=64)),
+                ('xslt_hash', models.CharField(max_length=64)),
+                ('output_hash', models.CharField(blank=True, help_text='Hash of the value written, empty when the galley did not contain the element.', max_length=64, null=True)),
+                ('date_transformed', models.DateTimeField(auto_now=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.article')),
+            ],
+            options={
+                'unique_together': {('article', 'field')},
+            },
+        ),
+    ]
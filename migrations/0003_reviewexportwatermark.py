@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0001_initial'),
+        ('scripts', '0002_transformjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewExportWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_exported', models.DateTimeField()),
+                ('journal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='journal.journal')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0003_reviewexportwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommandCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(max_length=255)),
+                ('key', models.CharField(help_text='Hash of the options that select what the command processes.', max_length=64)),
+                ('position', models.BigIntegerField(help_text='The last committed article ID or CSV row offset.')),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('command', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0004_commandcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transformjob',
+            name='output',
+            field=models.TextField(blank=True, help_text='The error the command failed with, if any. The full output of the command is written to a log file.'),
+        ),
+        migrations.AddField(
+            model_name='transformjob',
+            name='summary',
+            field=models.TextField(default='{}', help_text='JSON encoded summary of the outcome of the command.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0005_transformjob_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transformjob',
+            name='date_heartbeat',
+            field=models.DateTimeField(blank=True, help_text='When the worker running the job last reported progress.', null=True),
+        ),
+    ]
@@ -0,0 +1,147 @@
+import json
+
+from django.conf import settings
+from django.db import models
+
+
+class TransformManifest(models.Model):
+    """Records the inputs and output of the last JATS transform of an
+    Article field, so unchanged galleys can be skipped on later runs."""
+
+    article = models.ForeignKey(
+        'submission.Article',
+        on_delete=models.CASCADE,
+    )
+    field = models.CharField(max_length=255)
+    galley_path = models.TextField()
+    galley_mtime = models.FloatField()
+    galley_hash = models.CharField(max_length=64)
+    xslt_hash = models.CharField(max_length=64)
+    output_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        help_text='Hash of the value written, empty when the galley did '
+                  'not contain the element.',
+    )
+    date_transformed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('article', 'field')
+
+    def __str__(self):
+        return f'{self.field} of article {self.article_id}'
+
+
+class TransformJob(models.Model):
+    """A transform command queued from the manager to be run in the
+    background by the run_transform_jobs command."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'),
+    )
+
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    command = models.CharField(max_length=255)
+    options = models.TextField(
+        default='{}',
+        help_text='JSON encoded options passed to the command.',
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    total = models.PositiveIntegerField(blank=True, null=True)
+    processed = models.PositiveIntegerField(default=0)
+    output = models.TextField(
+        blank=True,
+        help_text='The error the command failed with, if any. The full '
+                  'output of the command is written to a log file.',
+    )
+    summary = models.TextField(
+        default='{}',
+        help_text='JSON encoded summary of the outcome of the command.',
+    )
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(blank=True, null=True)
+    date_finished = models.DateTimeField(blank=True, null=True)
+    date_heartbeat = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='When the worker running the job last reported progress.',
+    )
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return f'{self.command} for {self.journal} ({self.status})'
+
+    @property
+    def is_finished(self):
+        return self.status in {self.COMPLETE, self.FAILED}
+
+    def get_options(self):
+        return json.loads(self.options)
+
+    def set_options(self, options):
+        self.options = json.dumps(options)
+
+    def get_summary(self):
+        return json.loads(self.summary)
+
+    def set_summary(self, summary):
+        self.summary = json.dumps(summary)
+
+
+class ReviewExportWatermark(models.Model):
+    """The time of the last successful incremental review export of a
+    journal, used as the starting point for the next one."""
+
+    journal = models.OneToOneField(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    last_exported = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.journal} exported up to {self.last_exported}'
+
+
+class CommandCheckpoint(models.Model):
+    """The position reached by a long-running command, recorded after each
+    committed batch so an interrupted run can be continued with --resume."""
+
+    command = models.CharField(max_length=255)
+    key = models.CharField(
+        max_length=64,
+        help_text='Hash of the options that select what the command '
+                  'processes.',
+    )
+    position = models.BigIntegerField(
+        help_text='The last committed article ID or CSV row offset.',
+    )
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('command', 'key')
+
+    def __str__(self):
+        return f'{self.command} at {self.position}'
@@ -0,0 +1,187 @@
+import html
+
+from lxml import etree
+
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# Actions for a JATS element other than rendering it as an HTML element:
+# output only its content, or copy the element as it is, without attributes.
+CONTENT = "content"
+COPY = "copy"
+
+
+class Rule:
+    """Renders a JATS element as an HTML element around its content.
+
+    :param tag: the HTML tag
+    :param attributes: an optional function taking the JATS element and
+        returning a dict of the HTML element's attributes
+    """
+
+    __slots__ = ("tag", "attributes")
+
+    def __init__(self, tag, attributes=None):
+        self.tag = tag
+        self.attributes = attributes
+
+
+def ext_link_attributes(element):
+    return {"href": element.get(XLINK_HREF, "")}
+
+
+def xref_attributes(element):
+    return {"href": "#" + element.get("rid", "")}
+
+
+def email_attributes(element):
+    return {"href": "mailto:" + element.xpath("string()")}
+
+
+def small_caps_attributes(element):
+    return {"style": "font-variant: small-caps;"}
+
+
+class NativeRules:
+    """A table of tag to tag rewrites equivalent to one of the bundled XSLT.
+
+    Comments and processing instructions are dropped, as by the built-in
+    XSLT templates, and text is kept.
+
+    :param rules: a dict of Rule, CONTENT or COPY keyed by JATS tag
+    :param default: CONTENT or COPY, for elements not in rules
+    """
+
+    def __init__(self, rules, default=CONTENT):
+        self.rules = rules
+        self.default = default
+
+    def get(self, tag):
+        return self.rules.get(tag, self.default)
+
+
+# Equivalent to xsl/titles.xsl.
+TITLE_RULES = NativeRules(
+    {
+        "article-title": CONTENT,
+        "italic": Rule("i"),
+        "bold": Rule("b"),
+        "sup": Rule("sup"),
+        "sub": Rule("sub"),
+        "sc": Rule("span", small_caps_attributes),
+    },
+    default=CONTENT,
+)
+
+# Equivalent to xsl/abstracts.xsl.
+ABSTRACT_RULES = NativeRules(
+    {
+        "abstract": CONTENT,
+        "p": Rule("p"),
+        "bold": Rule("strong"),
+        "italic": Rule("em"),
+        "ext-link": Rule("a", ext_link_attributes),
+        "xref": Rule("a", xref_attributes),
+        "sub": Rule("sub"),
+        "sup": Rule("sup"),
+        "email": Rule("a", email_attributes),
+    },
+    default=COPY,
+)
+
+
+def append_text(target, text):
+    """Adds text after the last child of an output element."""
+    if not text:
+        return
+    if len(target):
+        last = target[-1]
+        last.tail = (last.tail or "") + text
+    else:
+        target.text = (target.text or "") + text
+
+
+def copy_nsmap(element):
+    """Returns the namespaces xsl:copy declares on a copy of an element.
+
+    These are the namespaces declared on the element itself, in order,
+    followed by the element's own namespace. lxml leaves out any already
+    declared on the output's ancestors, as libxslt does.
+    """
+    nsmap = {}
+    # iterwalk reports the declarations of each element before it starts.
+    for event, value in etree.iterwalk(element, events=("start", "start-ns")):
+        if event == "start":
+            break
+        prefix, namespace = value
+        nsmap[prefix or None] = namespace
+    if element.tag[0] == "{":
+        nsmap.setdefault(element.prefix, etree.QName(element).namespace)
+    return nsmap or None
+
+
+class NativeTransform:
+    """Applies NativeRules by walking the lxml tree of an element and
+    building the HTML elements directly, in place of a compiled XSLT.
+
+    Like an XSLT, calling it with an element returns a result that is
+    serialised with str().
+    """
+
+    engine = "native"
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def __call__(self, element):
+        container = etree.Element("div")
+        self.render(element, container)
+        return NativeResult(container)
+
+    def render(self, element, target):
+        rule = self.rules.get(element.tag)
+        if rule == CONTENT:
+            output = target
+        elif rule == COPY:
+            output = etree.SubElement(
+                target,
+                element.tag,
+                nsmap=copy_nsmap(element),
+            )
+        else:
+            output = etree.SubElement(
+                target,
+                rule.tag,
+                rule.attributes(element) if rule.attributes else None,
+            )
+
+        append_text(output, element.text)
+        for child in element:
+            # Comments and processing instructions have a function as tag.
+            if isinstance(child.tag, str):
+                self.render(child, output)
+            append_text(output, child.tail)
+
+
+class NativeResult:
+    """The output of a NativeTransform, held in a container element."""
+
+    def __init__(self, container):
+        self.container = container
+
+    def __str__(self):
+        """Serialises the output as the XSLT html output method does with
+        indent="yes". libxml2 only adds newlines between the children of an
+        element, so each top-level node is serialised on its own and the
+        newline lxml ends it with is removed."""
+        parts = [html.escape(self.container.text or "", quote=False)]
+        for child in self.container:
+            parts.append(etree.tostring(
+                child,
+                method="html",
+                encoding="unicode",
+                pretty_print=True,
+                with_tail=False,
+            ).rstrip("\n"))
+            parts.append(html.escape(child.tail or "", quote=False))
+        return "".join(parts)
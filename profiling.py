@@ -0,0 +1,183 @@
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.db import connection
+
+
+# The Profiler of the command being run with --profile, if any. Stages are
+# no-ops otherwise, so instrumented code costs a function call.
+_active = None
+
+
+def max_rss():
+    """Returns the maximum resident set size of this process in bytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere.
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class StageStats:
+    __slots__ = ("calls", "seconds", "queries", "query_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+class Profiler:
+    """Times named stages and counts the database queries run in each.
+
+    Stages can be nested. Each stage's time includes that of the stages
+    within it, while queries are counted against the innermost stage they
+    were run in. Stages are tracked per thread, and queries are only
+    counted on connections being watched, see watch_queries.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.seconds = None
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def get_stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    @contextmanager
+    def stage(self, name):
+        stack = self.get_stack()
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                stats = self.get_stats(name)
+                stats.calls += 1
+                stats.seconds += elapsed
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack = self.get_stack()
+            with self.lock:
+                self.queries += 1
+                self.query_seconds += elapsed
+                if stack:
+                    stats = self.get_stats(stack[-1])
+                    stats.queries += 1
+                    stats.query_seconds += elapsed
+
+    def watch_queries(self):
+        """Counts the queries run on this thread's default connection."""
+        return connection.execute_wrapper(self.execute_wrapper)
+
+    def finish(self):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self.start
+
+    def report(self):
+        seconds = self.seconds
+        if seconds is None:
+            seconds = time.perf_counter() - self.start
+        return {
+            "seconds": seconds,
+            "queries": self.queries,
+            "query_seconds": self.query_seconds,
+            "max_rss": max_rss(),
+            "stages": {
+                name: {
+                    "calls": stats.calls,
+                    "seconds": stats.seconds,
+                    "queries": stats.queries,
+                    "query_seconds": stats.query_seconds,
+                }
+                for name, stats in sorted(
+                    self.stages.items(),
+                    key=lambda item: item[1].seconds,
+                    reverse=True,
+                )
+            },
+        }
+
+    def format_table(self):
+        report = self.report()
+        lines = [
+            "{:<24}{:>10}{:>12}{:>10}{:>12}".format(
+                "stage", "calls", "seconds", "queries", "query s",
+            ),
+        ]
+        for name, stats in report["stages"].items():
+            lines.append("{:<24}{:>10}{:>12.3f}{:>10}{:>12.3f}".format(
+                name,
+                stats["calls"],
+                stats["seconds"],
+                stats["queries"],
+                stats["query_seconds"],
+            ))
+        lines.append("{:<24}{:>10}{:>12.3f}{:>10}{:>12.3f}".format(
+            "total",
+            "",
+            report["seconds"],
+            report["queries"],
+            report["query_seconds"],
+        ))
+        lines.append("Max RSS: {:.1f} MB".format(report["max_rss"] / 1024 / 1024))
+        return "\n".join(lines)
+
+    def format_json(self):
+        return json.dumps(self.report(), indent=2)
+
+
+@contextmanager
+def profile():
+    """Makes a new Profiler active for the block and yields it."""
+    global _active
+    profiler = Profiler()
+    _active = profiler
+    try:
+        with profiler.watch_queries():
+            yield profiler
+    finally:
+        profiler.finish()
+        _active = None
+
+
+def stage(name):
+    """Times a block as a stage of the active Profiler, if there is one."""
+    if _active is None:
+        return nullcontext()
+    return _active.stage(name)
+
+
+def watch_queries():
+    """Counts queries on this thread's connection for the active Profiler.
+
+    The connection of the thread that starts profiling is watched already,
+    other threads need to call this.
+    """
+    if _active is None:
+        return nullcontext()
+    return _active.watch_queries()
@@ -0,0 +1,163 @@
+import hashlib
+import hmac
+import random
+
+from faker import Faker
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Number of values generated with Faker for each pool. Pseudonyms are then
+# sampled from the pools rather than generated with Faker row by row.
+POOL_SIZE = 5000
+
+# Random titles have between this many words, inclusive.
+TITLE_WORDS = (4, 10)
+
+# The kind of pseudonym generated for each anonymised field.
+FIELD_KINDS = {
+    "title": "title",
+    "first_name": "first_name",
+    "last_name": "last_name",
+}
+
+
+def build_pool(generate, size):
+    """Calls generate size times and returns the distinct values in order."""
+    return list(dict.fromkeys(generate() for _ in range(size)))
+
+
+class PseudonymGenerator:
+    """Samples pseudonyms from pools of names and words built once.
+
+    Random values are drawn from a NumPy generator when NumPy is
+    installed and from random.Random otherwise. Given a seed, both the pools
+    and the values for each stream are reproducible.
+
+    Given a key, keyed_value maps the same original value to the same
+    pseudonym for a field, whichever model it comes from, using an HMAC of
+    the value to pick from the pools. The pools are then built from the key
+    rather than the seed, so keyed pseudonyms depend only on the key.
+
+    :param seed: an optional integer seed
+    :param key: an optional secret used for keyed pseudonyms
+    :param pool_size: the number of values generated for each pool
+    """
+
+    def __init__(self, seed=None, key=None, pool_size=POOL_SIZE):
+        self.seed = seed
+        self.key = key.encode() if isinstance(key, str) else key
+
+        fake = Faker()
+        pool_seed = self.get_pool_seed()
+        if pool_seed is not None:
+            fake.seed_instance(pool_seed)
+        self.pools = {
+            "first_name": build_pool(fake.first_name, pool_size),
+            "last_name": build_pool(fake.last_name, pool_size),
+            "title": build_pool(fake.word, pool_size),
+        }
+        if numpy:
+            self.arrays = {
+                kind: numpy.array(pool, dtype=object)
+                for kind, pool in self.pools.items()
+            }
+
+    def get_pool_seed(self):
+        """Returns the seed the pools are built with, derived from the key
+        if there is one, or None for random pools."""
+        if self.key:
+            digest = hmac.new(self.key, b"pools", hashlib.sha256).digest()
+            return int.from_bytes(digest[:8], "big")
+        return self.seed
+
+    def get_rng(self, stream):
+        """Returns a random number generator for a stream of values.
+
+        Streams let each chunk of rows be generated independently, e.g. by
+        different threads, while the result still depends only on the seed.
+        """
+        if numpy:
+            if self.seed is None:
+                return numpy.random.default_rng()
+            entropy = [self.seed] + [
+                int.from_bytes(hashlib.sha256(str(part).encode()).digest()[:4], "big")
+                for part in stream
+            ]
+            return numpy.random.default_rng(entropy)
+        if self.seed is None:
+            return random.Random()
+        return random.Random(":".join(str(part) for part in [self.seed, *stream]))
+
+    def random_values(self, field, count, stream=()):
+        """Returns count random pseudonyms for a field.
+
+        :param field: a key of FIELD_KINDS
+        :param count: the number of values to return
+        :param stream: a tuple identifying the values, see get_rng
+        """
+        kind = FIELD_KINDS[field]
+        rng = self.get_rng(stream)
+        if kind == "title":
+            return self.random_titles(rng, count)
+
+        if numpy:
+            pool = self.arrays[kind]
+            return pool[rng.integers(0, len(pool), size=count)].tolist()
+        return rng.choices(self.pools[kind], k=count)
+
+    def random_titles(self, rng, count):
+        min_words, max_words = TITLE_WORDS
+        words = self.pools["title"]
+        if numpy:
+            lengths = rng.integers(min_words, max_words + 1, size=count).tolist()
+            indices = rng.integers(0, len(words), size=(count, max_words)).tolist()
+        else:
+            lengths = [rng.randint(min_words, max_words) for _ in range(count)]
+            indices = [
+                [rng.randrange(len(words)) for _ in range(max_words)]
+                for _ in range(count)
+            ]
+        return [
+            self.make_title(words, row[:length])
+            for row, length in zip(indices, lengths)
+        ]
+
+    def keyed_value(self, field, original):
+        """Returns the pseudonym of an original value.
+
+        Empty values are returned unchanged. Comparison ignores case and
+        surrounding whitespace, so "Smith" and " smith" share a pseudonym.
+        """
+        if not original:
+            return original
+        if not self.key:
+            raise ValueError("A key is required for keyed pseudonyms.")
+
+        kind = FIELD_KINDS[field]
+        digest = hmac.new(
+            self.key,
+            f"{kind}:{original.strip().casefold()}".encode(),
+            hashlib.sha512,
+        ).digest()
+        numbers = [
+            int.from_bytes(digest[i:i + 4], "big")
+            for i in range(0, len(digest), 4)
+        ]
+
+        if kind == "title":
+            min_words, max_words = TITLE_WORDS
+            words = self.pools["title"]
+            length = min_words + numbers[0] % (max_words - min_words + 1)
+            return self.make_title(words, numbers[1:length + 1])
+
+        pool = self.pools[kind]
+        return pool[numbers[0] % len(pool)]
+
+    @staticmethod
+    def make_title(words, indices):
+        title = " ".join(words[index % len(words)] for index in indices)
+        return title[:1].upper() + title[1:] + "."
@@ -0,0 +1,247 @@
+import csv
+import gzip
+import json
+from collections import defaultdict
+
+from django.db.models import Q
+
+from review.models import (
+    ReviewAssignment,
+    ReviewAssignmentAnswer,
+    ReviewFormElement,
+)
+
+from plugins.scripts import profiling
+
+
+ASSIGNMENT_FIELDNAMES = [
+    "assignment_id",
+    "article_id",
+    "reviewer",
+    "editor",
+    "decision",
+    "date_requested",
+    "date_due",
+    "date_accepted",
+    "date_declined",
+    "date_complete",
+    "is_complete",
+]
+
+
+# An assignment has changed since a point in time if any of these is later.
+# Answers have no timestamp of their own, they are submitted when the review
+# is completed.
+CHANGE_DATE_FIELDS = [
+    "date_requested",
+    "date_accepted",
+    "date_declined",
+    "date_complete",
+]
+
+
+def changed_since(since):
+    changed = Q()
+    for field in CHANGE_DATE_FIELDS:
+        changed |= Q(**{f"{field}__gt": since})
+    return changed
+
+
+def get_assignments(journal_codes, since=None):
+    """Returns the review assignments of the given journals ordered by
+    journal code, so the assignments of each journal are contiguous.
+
+    :param journal_codes: the codes of the journals to export
+    :param since: an optional dict of datetimes keyed by journal code, only
+        assignments that changed after it are returned for those journals
+    """
+    since = since or {}
+    selected = Q()
+    for journal_code in journal_codes:
+        journal_selected = Q(article__journal__code=journal_code)
+        if since.get(journal_code):
+            journal_selected &= changed_since(since[journal_code])
+        selected |= journal_selected
+
+    return ReviewAssignment.objects.filter(
+        selected,
+    ).select_related(
+        "article",
+        "article__journal",
+        "reviewer",
+        "editor",
+    ).order_by(
+        "article__journal__code",
+        "pk",
+    )
+
+
+def get_element_headers(assignments):
+    """Returns the column header for each review form element answered in
+    the given assignments, keyed by element ID."""
+    all_elements = ReviewFormElement.objects.filter(
+        id__in=ReviewAssignmentAnswer.objects.filter(
+            assignment__in=assignments,
+        ).values_list(
+            "original_element_id",
+            flat=True,
+        ).distinct()
+    )
+
+    return {
+        element.id: element.name or f"element_{element.id}"
+        for element in all_elements
+    }
+
+
+def get_element_headers_by_journal(assignments):
+    """Returns the element headers, as get_element_headers, for each journal
+    with answers in the given assignments, keyed by journal code."""
+    answered = ReviewAssignmentAnswer.objects.filter(
+        assignment__in=assignments,
+    ).values_list(
+        "assignment__article__journal__code",
+        "original_element_id",
+    ).distinct()
+
+    journal_codes_by_element = defaultdict(set)
+    for journal_code, element_id in answered:
+        journal_codes_by_element[element_id].add(journal_code)
+
+    headers_by_journal = defaultdict(dict)
+    for element in ReviewFormElement.objects.filter(
+        id__in=list(journal_codes_by_element),
+    ):
+        for journal_code in journal_codes_by_element[element.id]:
+            headers_by_journal[journal_code][element.id] = (
+                element.name or f"element_{element.id}"
+            )
+    return headers_by_journal
+
+
+def get_fieldnames(element_headers):
+    return ASSIGNMENT_FIELDNAMES + list(element_headers.values())
+
+
+def iter_rows(assignments, element_headers, chunk_size=1000):
+    """Yields an export row for each assignment."""
+    for _assignment, row in iter_assignment_rows(
+        assignments,
+        element_headers,
+        chunk_size=chunk_size,
+    ):
+        yield row
+
+
+def iter_assignment_rows(assignments, element_headers, chunk_size=1000):
+    """Yields each assignment with its export row.
+
+    Assignments are streamed with iterator() and the answers for each chunk
+    of assignments are fetched in a single query, so the number of queries
+    grows with the number of chunks rather than the number of assignments.
+    """
+    chunk = []
+    for assignment in assignments.iterator(chunk_size=chunk_size):
+        chunk.append(assignment)
+        if len(chunk) >= chunk_size:
+            yield from build_rows(chunk, element_headers)
+            chunk = []
+    if chunk:
+        yield from build_rows(chunk, element_headers)
+
+
+def build_rows(assignments, element_headers):
+    answers = defaultdict(dict)
+    with profiling.stage("answers"):
+        answer_values = list(ReviewAssignmentAnswer.objects.filter(
+            assignment_id__in=[assignment.pk for assignment in assignments],
+        ).order_by(
+            "pk",
+        ).values_list(
+            "assignment_id",
+            "original_element_id",
+            "edited_answer",
+            "answer",
+        ))
+    for assignment_id, element_id, edited_answer, answer in answer_values:
+        header = element_headers.get(element_id)
+        if header:
+            answers[assignment_id][header] = edited_answer or answer
+
+    for assignment in assignments:
+        row = {
+            "assignment_id": assignment.id,
+            "article_id": assignment.article_id,
+            "reviewer": assignment.reviewer.full_name(),
+            "editor": assignment.editor.full_name() if assignment.editor else '',
+            "decision": assignment.decision,
+            "date_requested": assignment.date_requested,
+            "date_due": assignment.date_due,
+            "date_accepted": assignment.date_accepted,
+            "date_declined": assignment.date_declined,
+            "date_complete": assignment.date_complete,
+            "is_complete": assignment.is_complete,
+        }
+        row.update(answers[assignment.pk])
+        yield assignment, row
+
+
+class Echo:
+    """Implements only the write method of a file, so a csv writer returns
+    each formatted row instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+class CSVExportWriter:
+    extension = "csv"
+
+    def __init__(self, file, fieldnames):
+        self.writer = csv.DictWriter(file, fieldnames=fieldnames)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+class JSONLinesExportWriter:
+    extension = "jsonl"
+
+    def __init__(self, file, fieldnames):
+        self.file = file
+        self.fieldnames = fieldnames
+
+    def write(self, row):
+        self.file.write(json.dumps(
+            {field: row.get(field) for field in self.fieldnames},
+            default=str,
+        ) + "\n")
+
+
+EXPORT_WRITERS = {
+    "csv": CSVExportWriter,
+    "jsonl": JSONLinesExportWriter,
+}
+
+
+def get_filename(journal_code, export_format="csv", compress=False):
+    extension = EXPORT_WRITERS[export_format].extension
+    filename = f"review_assignments_export_{journal_code}.{extension}"
+    if compress:
+        filename += ".gz"
+    return filename
+
+
+def open_export_file(path, compress=False):
+    if compress:
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def iter_csv(assignments, element_headers, chunk_size=1000):
+    """Yields the export as CSV formatted lines, starting with the header."""
+    writer = csv.DictWriter(Echo(), fieldnames=get_fieldnames(element_headers))
+    yield writer.writeheader()
+    for row in iter_rows(assignments, element_headers, chunk_size=chunk_size):
+        yield writer.writerow(row)
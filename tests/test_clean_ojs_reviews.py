@@ -0,0 +1,105 @@
+import io
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core import models as core_models
+from journal import models as journal_models
+from review import models as review_models
+from submission import models as submission_models
+
+
+JOURNAL_CODE = 'clean'
+SEPARATOR = '|EDITOR|'
+
+# The answers of each assignment, in the order they are created.
+ASSIGNMENT_ANSWERS = [
+    ['Review text |EDITOR| For the editor'],
+    ['|EDITOR| Only for the editor'],
+    ['One |EDITOR| two |EDITOR| three'],
+    ['First |EDITOR| first tail', 'No separator', 'Last |EDITOR| last tail'],
+    ['No separator at all'],
+]
+
+
+class TestCleanOJSReviews(TestCase):
+    """Both engines must split each answer as str.partition does."""
+
+    def setUp(self):
+        journal = journal_models.Journal.objects.create(
+            code=JOURNAL_CODE,
+            domain='clean.localhost',
+        )
+        article = submission_models.Article.objects.create(
+            journal=journal,
+            title='Article',
+            stage=submission_models.STAGE_UNDER_REVIEW,
+        )
+        reviewer = core_models.Account.objects.create(
+            username='reviewer',
+            email='reviewer@clean.localhost',
+        )
+        element = review_models.ReviewFormElement.objects.create(
+            name='Question',
+            kind='text',
+            order=0,
+        )
+        for answers in ASSIGNMENT_ANSWERS:
+            assignment = review_models.ReviewAssignment.objects.create(
+                article=article,
+                reviewer=reviewer,
+                editor=reviewer,
+                date_due=timezone.now(),
+                comments_for_editor='Unchanged',
+            )
+            for answer in answers:
+                review_models.ReviewAssignmentAnswer.objects.create(
+                    assignment=assignment,
+                    original_element=element,
+                    answer=answer,
+                )
+
+    def expected(self):
+        """Returns the answers and comments for the editor of each
+        assignment after splitting them in Python, the answer with the
+        highest pk giving the comments."""
+        answers = {}
+        comments = {}
+        for answer in review_models.ReviewAssignmentAnswer.objects.order_by('pk'):
+            head, sep, tail = answer.answer.partition(SEPARATOR)
+            answers[answer.pk] = head
+            if sep:
+                comments[answer.assignment_id] = tail
+        for assignment in review_models.ReviewAssignment.objects.all():
+            comments.setdefault(assignment.pk, assignment.comments_for_editor)
+        return answers, comments
+
+    def actual(self):
+        return (
+            dict(review_models.ReviewAssignmentAnswer.objects.values_list(
+                'pk', 'answer',
+            )),
+            dict(review_models.ReviewAssignment.objects.values_list(
+                'pk', 'comments_for_editor',
+            )),
+        )
+
+    def test_engines_match_partition(self):
+        expected = self.expected()
+        for engine in ['database', 'python']:
+            with self.subTest(engine=engine):
+                savepoint = transaction.savepoint()
+                try:
+                    call_command(
+                        'clean_ojs_reviews',
+                        JOURNAL_CODE,
+                        SEPARATOR,
+                        '--engine', engine,
+                        '--batch-size', '2',
+                        stdout=io.StringIO(),
+                    )
+                    self.assertEqual(self.actual(), expected)
+                finally:
+                    transaction.savepoint_rollback(savepoint)
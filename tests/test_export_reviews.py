@@ -0,0 +1,39 @@
+import csv
+import io
+import os
+
+from django.core.management import call_command
+
+from plugins.scripts import reviews
+from plugins.scripts.tests.test_query_budgets import (
+    JOURNAL_CODE,
+    QueryBudgetTestCase,
+)
+
+
+class TestExportReviews(QueryBudgetTestCase):
+
+    def read_export(self):
+        path = os.path.join(self.base_dir, reviews.get_filename(JOURNAL_CODE))
+        with open(path, newline='') as export_file:
+            return list(csv.DictReader(export_file))
+
+    def test_journal_keyword_as_string(self):
+        self.create_reviews(3)
+        call_command(
+            'export_reviews',
+            journal=JOURNAL_CODE,
+            output_dir=self.base_dir,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(len(self.read_export()), 3)
+
+    def test_journal_keyword_as_list(self):
+        self.create_reviews(3)
+        call_command(
+            'export_reviews',
+            journal=[JOURNAL_CODE],
+            output_dir=self.base_dir,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(len(self.read_export()), 3)
@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+from lxml import etree
+
+from plugins.scripts import benchmark, jats
+
+
+# Text covering the characters escaped by the XSLT html output method, the
+# quotes it leaves alone, whitespace and a range of non-ASCII characters.
+SPECIAL_TEXT = (
+    ' Tom &amp; Jerry &lt;b&gt; "quoted" \'single\' '
+    + ''.join(chr(code) for code in range(0xa0, 0x250))
+    + '\u2013\u2014\u2028\u200b\ufeff\U0001f600 '
+)
+
+PLAIN_CASES = [
+    ('title', f'<article-title>{SPECIAL_TEXT}</article-title>'),
+    ('title', '<article-title>\n  Spread over\n  lines\t</article-title>'),
+    ('title', '<article-title><![CDATA[a < b && c]]></article-title>'),
+    ('title', '<article-title></article-title>'),
+    ('title', '<article-title>   </article-title>'),
+    ('abstract', f'<abstract>{SPECIAL_TEXT}</abstract>'),
+    ('abstract', f'<abstract><p>{SPECIAL_TEXT}</p></abstract>'),
+    ('abstract', '<abstract>\n  <p>One</p>\n  <p>Two</p>\n</abstract>'),
+    ('abstract', '<abstract>Lead <p>One</p>between<p>Two</p> end</abstract>'),
+    ('abstract', '<abstract><p id="p1" xml:lang="en">One</p><p/></abstract>'),
+]
+
+MARKUP_CASES = [
+    ('title', '<article-title>With <italic>markup</italic></article-title>'),
+    ('title', '<article-title>With <!-- a comment --></article-title>'),
+    ('title', '<article-title>With <?pi target?></article-title>'),
+    ('abstract', '<abstract><title>Abstract</title><p>One</p></abstract>'),
+    ('abstract', '<abstract><p>With <bold>markup</bold></p></abstract>'),
+    ('abstract', '<abstract><sec><p>Nested</p></sec></abstract>'),
+    ('abstract', '<abstract xmlns:j="urn:j"><j:p>Namespaced</j:p></abstract>'),
+]
+
+
+class TestRenderPlain(SimpleTestCase):
+    """render_plain must give the same output as the bundled stylesheets
+    for every element it renders."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.transforms = {
+            name: jats.load_transform(mapping.xslt_file)
+            for name, mapping in jats.FIELD_MAPPINGS.items()
+        }
+
+    def render_xslt(self, name, element):
+        return jats.transform_element(element, self.transforms[name])
+
+    def assertMatchesXSLT(self, name, element):
+        """Asserts that an element rendered without the XSLT, if it could
+        be, matches the XSLT output, returning whether it could be."""
+        mapping = jats.FIELD_MAPPINGS[name]
+        plain = jats.render_plain(element, mapping.plain_tags)
+        if plain is not None:
+            self.assertEqual(plain, self.render_xslt(name, element))
+        return plain is not None
+
+    def test_plain_elements(self):
+        for name, xml in PLAIN_CASES:
+            with self.subTest(xml=xml):
+                self.assertTrue(
+                    self.assertMatchesXSLT(name, etree.fromstring(xml)),
+                )
+
+    def test_markup_uses_xslt(self):
+        for name, xml in MARKUP_CASES:
+            with self.subTest(xml=xml):
+                mapping = jats.FIELD_MAPPINGS[name]
+                element = etree.fromstring(xml)
+                self.assertIsNone(
+                    jats.render_plain(element, mapping.plain_tags),
+                )
+                self.assertEqual(
+                    jats.transform_element(
+                        element,
+                        self.transforms[name],
+                        plain_tags=mapping.plain_tags,
+                    ),
+                    self.render_xslt(name, element),
+                )
+
+    def test_corpus(self):
+        corpus_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, corpus_dir)
+        for markup in ['plain', 'heavy']:
+            corpus = benchmark.generate_corpus(
+                f'{corpus_dir}/{markup}',
+                50,
+                large_ratio=0,
+                markup=markup,
+                seed=1,
+            )
+            rendered = 0
+            for _size, path in corpus:
+                tree = jats.parse_galley(path)
+                for name, mapping in jats.FIELD_MAPPINGS.items():
+                    with self.subTest(markup=markup, path=path, field=name):
+                        element = tree.find(mapping.xpath)
+                        rendered += self.assertMatchesXSLT(name, element)
+            if markup == 'plain':
+                self.assertEqual(rendered, len(corpus) * len(jats.FIELD_MAPPINGS))
+
+    def test_custom_xslt_uses_xslt(self):
+        mapping = jats.FIELD_MAPPINGS['title']
+        self.assertEqual(
+            mapping.with_xslt_file(mapping.xslt_file).plain_tags,
+            mapping.plain_tags,
+        )
+        self.assertIsNone(
+            mapping.with_xslt_file('/custom/titles.xsl').plain_tags,
+        )
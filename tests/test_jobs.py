@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from journal import models as journal_models
+
+from plugins.scripts import jobs, models
+from plugins.scripts.tests.test_query_budgets import (
+    JOURNAL_CODE,
+    QueryBudgetTestCase,
+)
+
+
+class TestStaleJobs(TestCase):
+
+    def setUp(self):
+        self.journal = journal_models.Journal.objects.create(
+            code='jobs',
+            domain='jobs.localhost',
+        )
+
+    def create_running_job(self, heartbeat_age):
+        job = jobs.enqueue(self.journal, 'jats_to_html', {})
+        models.TransformJob.objects.filter(pk=job.pk).update(
+            status=models.TransformJob.RUNNING,
+            date_started=timezone.now() - heartbeat_age,
+            date_heartbeat=timezone.now() - heartbeat_age,
+        )
+        return job
+
+    def test_claim_records_heartbeat(self):
+        jobs.enqueue(self.journal, 'jats_to_html', {})
+        job = jobs.claim_next_job()
+        self.assertEqual(job.status, models.TransformJob.RUNNING)
+        self.assertIsNotNone(job.date_heartbeat)
+
+    def test_fail_stale_jobs(self):
+        stale = self.create_running_job(timedelta(hours=2))
+        active = self.create_running_job(timedelta(minutes=5))
+
+        self.assertEqual(jobs.fail_stale_jobs(timedelta(hours=1)), 1)
+
+        stale.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual(stale.status, models.TransformJob.FAILED)
+        self.assertEqual(stale.output, jobs.STALE_JOB_ERROR)
+        self.assertIsNotNone(stale.date_finished)
+        self.assertTrue(stale.is_finished)
+        self.assertEqual(active.status, models.TransformJob.RUNNING)
+
+
+class TestRunStaleJob(QueryBudgetTestCase):
+
+    def test_job_failed_as_stale_stops_and_stays_failed(self):
+        articles = self.create_articles(4)
+        jobs.enqueue(
+            self.journal,
+            'jats_to_html',
+            {'journal_codes': [JOURNAL_CODE], 'chunk_size': 2},
+        )
+        job = jobs.claim_next_job()
+        models.TransformJob.objects.filter(pk=job.pk).update(
+            date_heartbeat=timezone.now() - timedelta(hours=2),
+        )
+        jobs.fail_stale_jobs(timedelta(hours=1))
+
+        jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.TransformJob.FAILED)
+        self.assertEqual(job.output, jobs.STALE_JOB_ERROR)
+        self.assertEqual(job.processed, 0)
+        for article in articles:
+            self.assertEqual(
+                article.__class__.objects.get(pk=article.pk).title,
+                article.title,
+            )
+        with open(jobs.get_log_path(job)) as log_file:
+            self.assertIn(f'Job {job.pk} is no longer running.', log_file.read())
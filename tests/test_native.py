@@ -0,0 +1,118 @@
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+from lxml import etree
+
+from plugins.scripts import benchmark, jats
+from plugins.scripts.tests.test_jats import MARKUP_CASES, PLAIN_CASES
+
+
+ARTICLE = (
+    '<article xmlns:xlink="http://www.w3.org/1999/xlink" '
+    'xmlns:mml="http://www.w3.org/1998/Math/MathML"><front>{}</front>'
+    '</article>'
+)
+
+# Elements inside an article, where the xlink and MathML namespaces are in
+# scope, covering the rules of each stylesheet and their fallbacks.
+NESTED_CASES = [
+    ('abstract', '<abstract><sec><title>T</title><p>a</p><p>b</p></sec>'
+                 '<list><list-item><p>x</p></list-item>'
+                 '<list-item><p>y</p></list-item></list></abstract>'),
+    ('abstract', '<abstract><p>a <mml:math><mml:mi>x</mml:mi></mml:math> b'
+                 '</p></abstract>'),
+    ('abstract', '<abstract><p>a <ext-link xlink:href="http://x.org/a b?q='
+                 'é&amp;r=&quot;1&quot;">l</ext-link> <xref rid="R1">1'
+                 '</xref> <email>me@x.org</email> <ext-link>none</ext-link>'
+                 '</p></abstract>'),
+    ('abstract', '<abstract><p>x<!-- c -->y<?pi z?>w</p><div><span>s</span>'
+                 '</div><table><tr><td>1</td></tr></table></abstract>'),
+    ('abstract', '<abstract><p>a<break/>b</p><p>c<br/>d<hr/></p></abstract>'),
+    # Namespaces declared on copied elements, including ones the article
+    # already declares.
+    ('abstract', '<abstract><p><uri xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 'xlink:href="http://x.org">x</uri></p></abstract>'),
+    ('abstract', '<abstract><p><inline-graphic '
+                 'xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 'xlink:href="a.png"/></p></abstract>'),
+    ('abstract', '<abstract><p><mml:math '
+                 'xmlns:mml="http://www.w3.org/1998/Math/MathML" '
+                 'xmlns:xlink="http://www.w3.org/1999/xlink"><mml:mi>x</mml:mi>'
+                 '</mml:math></p></abstract>'),
+    ('abstract', '<abstract><p><mml:math '
+                 'xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 'xmlns:mml="http://www.w3.org/1998/Math/MathML"><mml:mi>x'
+                 '</mml:mi></mml:math></p></abstract>'),
+    ('abstract', '<abstract><p xmlns:a="urn:a"><x xmlns:a="urn:a"/></p>'
+                 '</abstract>'),
+    ('abstract', '<abstract><sec xmlns:a="urn:a"><title xmlns:a="urn:a">T'
+                 '</title><list xmlns:a="urn:b"><x xmlns:b="urn:b"/></list>'
+                 '</sec></abstract>'),
+    ('abstract', '<abstract xmlns:q="urn:q"><sec xmlns:r="urn:r"><p '
+                 'xmlns:s="urn:s"><q:y xmlns:t="urn:t"/></p></sec></abstract>'),
+    ('abstract', '<abstract><p><x xmlns="urn:d" xmlns:a="urn:a"><y xmlns=""/>'
+                 '</x></p></abstract>'),
+    ('abstract', '<abstract><p xmlns:u="urn:u"><bold xmlns:v="urn:v"><sc '
+                 'xmlns:w="urn:w">z</sc></bold></p></abstract>'),
+    ('title', '<title-group><article-title>A <sc>b</sc> <named-content>c '
+              '<italic>d</italic></named-content><mml:math><mml:mi>x</mml:mi>'
+              '</mml:math><break/>z</article-title></title-group>'),
+]
+
+
+class TestNativeTransform(SimpleTestCase):
+    """The native rules must give the same output as the bundled stylesheets
+    they stand in for."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.xslt = jats.load_transforms(jats.FIELD_MAPPINGS.values())
+        cls.native = jats.load_transforms(
+            jats.FIELD_MAPPINGS.values(),
+            jats.NATIVE_ENGINE,
+        )
+
+    def assertMatchesXSLT(self, name, element):
+        self.assertEqual(
+            jats.transform_element(element, self.native[name]),
+            jats.transform_element(element, self.xslt[name]),
+        )
+
+    def test_cases(self):
+        for name, xml in PLAIN_CASES + MARKUP_CASES:
+            with self.subTest(xml=xml):
+                self.assertMatchesXSLT(name, etree.fromstring(xml))
+
+    def test_nested_cases(self):
+        for name, xml in NESTED_CASES:
+            with self.subTest(xml=xml):
+                tree = etree.fromstring(ARTICLE.format(xml))
+                element = tree.find(jats.FIELD_MAPPINGS[name].xpath)
+                self.assertMatchesXSLT(name, element)
+
+    def test_corpus(self):
+        corpus_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, corpus_dir)
+        for markup in ['plain', 'heavy']:
+            corpus = benchmark.generate_corpus(
+                f'{corpus_dir}/{markup}',
+                50,
+                large_ratio=0,
+                markup=markup,
+                seed=1,
+            )
+            for _size, path in corpus:
+                tree = jats.parse_galley(path)
+                for name, mapping in jats.FIELD_MAPPINGS.items():
+                    with self.subTest(markup=markup, path=path, field=name):
+                        self.assertMatchesXSLT(name, tree.find(mapping.xpath))
+
+    def test_custom_xslt_has_no_native_rules(self):
+        mapping = jats.FIELD_MAPPINGS['title'].with_xslt_file(
+            '/custom/titles.xsl',
+        )
+        self.assertIsNone(mapping.native_rules)
+        with self.assertRaises(ValueError):
+            jats.load_transforms([mapping], jats.NATIVE_ENGINE)
@@ -0,0 +1,102 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+
+from core import models as core_models
+from journal import models as journal_models
+
+
+JOURNAL_CODE = 'csv'
+
+ROWS = [
+    # An existing inactive account, with the domain in a different case.
+    ('Ada@EXAMPLE.org', '', 'Yes', 'No'),
+    # A mixed case username.
+    ('grace@example.org', 'GraceH', 'Yes', 'Yes'),
+    # Emails differing only in the case of the local part share a username.
+    ('Bob@example.org', '', 'No', 'Yes'),
+    ('bob@example.org', '', 'Yes', 'No'),
+    # An existing account with a username equal to the email.
+    ('Carol@Example.org', '', 'No', 'Yes'),
+    ('', 'nobody', 'Yes', 'No'),
+    ('dan@example.org', 'DAN', 'Yes', 'Yes'),
+]
+
+
+class TestOJSUserCSVImport(TestCase):
+    """The bulk import must leave the same accounts and roles as the row by
+    row import of the same CSV."""
+
+    def setUp(self):
+        self.journal = journal_models.Journal.objects.create(
+            code=JOURNAL_CODE,
+            domain='csv.localhost',
+        )
+        for name, slug in [('Author', 'author'), ('Reviewer', 'reviewer')]:
+            core_models.Role.objects.get_or_create(name=name, slug=slug)
+        core_models.Account.objects.create(
+            username='ada@example.org',
+            email='Ada@example.org',
+            is_active=False,
+        )
+        core_models.Account.objects.create(
+            username='carol@example.org',
+            email='carol.old@example.org',
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.csv_path = os.path.join(directory, 'users.csv')
+        with open(self.csv_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['Email', 'Username', 'Author', 'Reviewer'])
+            writer.writerows(ROWS)
+
+    def import_state(self, *args):
+        """Imports the CSV and returns the accounts and roles it leaves,
+        rolling the import back."""
+        savepoint = transaction.savepoint()
+        try:
+            call_command(
+                'ojs_user_csv_import',
+                '--csv-path', self.csv_path,
+                '--journal-code', JOURNAL_CODE,
+                '--activate-accounts',
+                *args,
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+            accounts = sorted(core_models.Account.objects.values_list(
+                'email', 'username', 'is_active',
+            ))
+            roles = sorted(core_models.AccountRole.objects.filter(
+                journal=self.journal,
+            ).values_list('user__username', 'role__slug'))
+            return accounts, roles
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def test_bulk_matches_rows(self):
+        accounts, roles = self.import_state()
+        self.assertEqual(accounts, [
+            ('Ada@example.org', 'ada@example.org', True),
+            ('Bob@example.org', 'bob@example.org', True),
+            ('carol.old@example.org', 'carol@example.org', True),
+            ('dan@example.org', 'dan', True),
+            ('grace@example.org', 'graceh', True),
+        ])
+        self.assertIn(('bob@example.org', 'author'), roles)
+        self.assertIn(('carol@example.org', 'reviewer'), roles)
+
+        for chunk_size in ['1', '3', '100']:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    self.import_state('--bulk', '--chunk-size', chunk_size),
+                    (accounts, roles),
+                )
@@ -0,0 +1,34 @@
+from django.test import SimpleTestCase
+
+from plugins.scripts import pseudonyms
+
+
+ORIGINALS = {
+    'last_name': ['Smith', 'Jones', 'Brown'],
+    'first_name': ['Ada', 'Grace'],
+    'title': ['A study of archives'],
+}
+
+
+class TestKeyedPseudonyms(SimpleTestCase):
+
+    def keyed_values(self, generator):
+        return {
+            field: [generator.keyed_value(field, value) for value in values]
+            for field, values in ORIGINALS.items()
+        }
+
+    def test_same_key_maps_values_identically(self):
+        first = pseudonyms.PseudonymGenerator(key='secret', pool_size=200)
+        second = pseudonyms.PseudonymGenerator(key='secret', pool_size=200)
+        self.assertEqual(self.keyed_values(first), self.keyed_values(second))
+
+    def test_key_overrides_seed(self):
+        first = pseudonyms.PseudonymGenerator(seed=1, key='secret', pool_size=200)
+        second = pseudonyms.PseudonymGenerator(seed=2, key='secret', pool_size=200)
+        self.assertEqual(self.keyed_values(first), self.keyed_values(second))
+
+    def test_different_keys(self):
+        first = pseudonyms.PseudonymGenerator(key='secret', pool_size=200)
+        second = pseudonyms.PseudonymGenerator(key='other', pool_size=200)
+        self.assertNotEqual(self.keyed_values(first), self.keyed_values(second))
@@ -0,0 +1,346 @@
+"""Query budgets for the plugin's management commands.
+
+Each command is run against data seeded at two sizes and must stay within a
+fixed number of queries at both, running no more queries against the larger
+data set than against the smaller one. A command that looks rows up one at a
+time, an N+1, fails at the larger size.
+
+setting_value is not covered, as each changed value is saved individually
+for its translations, and nor is benchmark_transforms, which creates its own
+test database.
+"""
+import csv
+import io
+import os
+import random
+import shutil
+import tempfile
+import uuid
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import models as core_models
+from journal import models as journal_models
+from review import models as review_models
+from submission import models as submission_models
+
+from plugins.scripts import benchmark, jats, jobs
+
+
+SIZES = (4, 16)
+
+JOURNAL_CODE = 'budget'
+SEPARATOR = '|EDITOR|'
+
+
+class QueryBudgetTestCase(TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        base_dir_override = override_settings(BASE_DIR=self.base_dir)
+        base_dir_override.enable()
+        self.addCleanup(base_dir_override.disable)
+
+        self.journal = journal_models.Journal.objects.create(
+            code=JOURNAL_CODE,
+            domain='budget.localhost',
+        )
+
+    def run_command(self, command, args):
+        """Runs a command, returning the number of queries it ran."""
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                command,
+                *args,
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+        return len(queries)
+
+    def assertQueryBudget(self, budget, seed, command, args=None):
+        """Runs a command after seeding each of SIZES.
+
+        :param budget: the most queries the command may run
+        :param seed: a function given the size, which creates the data
+        :param command: the name of the command
+        :param args: a list of arguments for the command
+        """
+        counts = []
+        for size in SIZES:
+            savepoint = transaction.savepoint()
+            try:
+                seed(size)
+                counts.append(self.run_command(command, args or []))
+            finally:
+                transaction.savepoint_rollback(savepoint)
+
+        for size, count in zip(SIZES, counts):
+            self.assertLessEqual(
+                count,
+                budget,
+                f'{command} ran {count} queries with {size} rows, over its '
+                f'budget of {budget}.',
+            )
+        self.assertLessEqual(
+            counts[-1],
+            counts[0],
+            f'{command} ran {counts[0]} queries with {SIZES[0]} rows and '
+            f'{counts[-1]} with {SIZES[-1]}.',
+        )
+
+    def create_articles(self, size, stage=submission_models.STAGE_UNDER_REVIEW):
+        """Creates articles with an XML galley of generated JATS."""
+        rng = random.Random(size)
+        articles = []
+        for index in range(size):
+            article = submission_models.Article.objects.create(
+                journal=self.journal,
+                title=f'Article {index}',
+                stage=stage,
+            )
+            file = core_models.File.objects.create(
+                mime_type='application/xml',
+                original_filename=f'galley-{index}.xml',
+                uuid_filename=f'{uuid.uuid4()}.xml',
+                label='XML',
+                article_id=article.pk,
+            )
+            core_models.Galley.objects.create(
+                article=article,
+                file=file,
+                label='XML',
+                type='xml',
+            )
+            file_path = file.get_file_path(article)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as galley:
+                galley.write(benchmark.generate_galley(rng, index))
+            articles.append(article)
+        return articles
+
+    def create_reviews(self, size):
+        """Creates an assignment with an answer to each of three elements
+        for each of the articles, with text for the editor after SEPARATOR."""
+        reviewer = core_models.Account.objects.create(
+            username=f'reviewer-{size}',
+            email=f'reviewer-{size}@budget.localhost',
+        )
+        elements = [
+            review_models.ReviewFormElement.objects.create(
+                name=f'Question {order}',
+                kind='text',
+                order=order,
+            )
+            for order in range(3)
+        ]
+        for article in self.create_articles(size):
+            assignment = review_models.ReviewAssignment.objects.create(
+                article=article,
+                reviewer=reviewer,
+                editor=reviewer,
+                date_due=timezone.now(),
+            )
+            for element in elements:
+                review_models.ReviewAssignmentAnswer.objects.create(
+                    assignment=assignment,
+                    original_element=element,
+                    answer=f'Answer {element.order} {SEPARATOR} For the editor',
+                )
+
+
+class TestTransformQueryBudgets(QueryBudgetTestCase):
+
+    def test_jats_to_html(self):
+        self.assertQueryBudget(
+            30,
+            self.create_articles,
+            'jats_to_html',
+            ['--journal-codes', JOURNAL_CODE, '--force'],
+        )
+
+    def test_jats_to_html_unchanged(self):
+        def seed(size):
+            self.create_articles(size)
+            self.run_command(
+                'jats_to_html',
+                ['--journal-codes', JOURNAL_CODE],
+            )
+
+        self.assertQueryBudget(
+            20,
+            seed,
+            'jats_to_html',
+            ['--journal-codes', JOURNAL_CODE],
+        )
+
+    def test_jats_title_to_html(self):
+        self.assertQueryBudget(
+            30,
+            self.create_articles,
+            'jats_title_to_html',
+            [
+                '--journal-codes', JOURNAL_CODE,
+                '--xslt-file', jats.FIELD_MAPPINGS['title'].xslt_file,
+                '--force',
+            ],
+        )
+
+    def test_jats_abstract_to_html(self):
+        self.assertQueryBudget(
+            30,
+            self.create_articles,
+            'jats_abstract_to_html',
+            [
+                '--journal-codes', JOURNAL_CODE,
+                '--xslt-file', jats.FIELD_MAPPINGS['abstract'].xslt_file,
+                '--force',
+            ],
+        )
+
+    def test_run_transform_jobs(self):
+        def seed(size):
+            self.create_articles(size)
+            jobs.enqueue(
+                self.journal,
+                'jats_to_html',
+                {'journal_codes': [JOURNAL_CODE], 'force': True},
+            )
+
+        self.assertQueryBudget(40, seed, 'run_transform_jobs', ['--once'])
+
+
+class TestReviewQueryBudgets(QueryBudgetTestCase):
+
+    def test_export_reviews(self):
+        self.assertQueryBudget(
+            10,
+            self.create_reviews,
+            'export_reviews',
+            [
+                '--journal', JOURNAL_CODE,
+                '--output-dir', self.base_dir,
+            ],
+        )
+
+    def test_export_reviews_incremental(self):
+        self.assertQueryBudget(
+            20,
+            self.create_reviews,
+            'export_reviews',
+            [
+                '--all-journals',
+                '--incremental',
+                '--format', 'jsonl',
+                '--gzip',
+                '--output-dir', self.base_dir,
+            ],
+        )
+
+    def test_clean_ojs_reviews(self):
+        self.assertQueryBudget(
+            10,
+            self.create_reviews,
+            'clean_ojs_reviews',
+            [JOURNAL_CODE, SEPARATOR],
+        )
+
+    def test_clean_ojs_reviews_python(self):
+        self.assertQueryBudget(
+            15,
+            self.create_reviews,
+            'clean_ojs_reviews',
+            [JOURNAL_CODE, SEPARATOR, '--engine', 'python'],
+        )
+
+
+class TestAccountQueryBudgets(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, slug in [('Author', 'author'), ('Reviewer', 'reviewer')]:
+            core_models.Role.objects.get_or_create(name=name, slug=slug)
+        self.csv_path = os.path.join(self.base_dir, 'users.csv')
+
+    def write_users_csv(self, size):
+        """Writes a CSV of users, a quarter of whom already have accounts."""
+        with open(self.csv_path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=[
+                'Email', 'Username', 'First Name', 'Last Name',
+                'Author', 'Reviewer',
+            ])
+            writer.writeheader()
+            for index in range(size):
+                email = f'user-{size}-{index}@budget.localhost'
+                if index % 4 == 0:
+                    core_models.Account.objects.create(
+                        username=email,
+                        email=email,
+                        is_active=False,
+                    )
+                writer.writerow({
+                    'Email': email,
+                    'Username': email,
+                    'First Name': 'First',
+                    'Last Name': 'Last',
+                    'Author': 'Yes',
+                    'Reviewer': 'Yes' if index % 2 else 'No',
+                })
+
+    def test_ojs_user_csv_import_bulk(self):
+        self.assertQueryBudget(
+            25,
+            self.write_users_csv,
+            'ojs_user_csv_import',
+            [
+                '--csv-path', self.csv_path,
+                '--journal-code', JOURNAL_CODE,
+                '--activate-accounts',
+                '--bulk',
+            ],
+        )
+
+    def test_fake_titles_names(self):
+        def seed(size):
+            for article in self.create_articles(size):
+                submission_models.FrozenAuthor.objects.create(
+                    article=article,
+                    first_name='First',
+                    last_name='Last',
+                )
+                core_models.Account.objects.create(
+                    username=f'account-{article.pk}',
+                    email=f'account-{article.pk}@budget.localhost',
+                    first_name='First',
+                    last_name='Last',
+                )
+
+        self.assertQueryBudget(
+            25,
+            seed,
+            'fake_titles_names',
+            ['--seed', '1', '--pool-size', '50'],
+        )
+
+
+class TestJournalQueryBudgets(QueryBudgetTestCase):
+
+    def test_list_journals_inventory(self):
+        def seed(size):
+            for index in range(size):
+                journal_models.Journal.objects.create(
+                    code=f'{JOURNAL_CODE}-{size}-{index}',
+                    domain=f'{size}-{index}.budget.localhost',
+                )
+            self.create_reviews(size)
+
+        self.assertQueryBudget(
+            1,
+            seed,
+            'list_journals',
+            ['inventory', '--format', 'json'],
+        )
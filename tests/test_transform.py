@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.db import DatabaseError
+
+from plugins.scripts import checkpoints, models, transform
+from plugins.scripts.tests.test_query_budgets import (
+    JOURNAL_CODE,
+    QueryBudgetTestCase,
+)
+
+
+class TestResume(QueryBudgetTestCase):
+    """A run whose batch fails to save must be resumable without skipping
+    the articles in that batch."""
+
+    ARGS = [
+        '--journal-codes', JOURNAL_CODE,
+        '--batch-size', '3',
+        '--chunk-size', '3',
+    ]
+
+    def failing_flush(self, failures):
+        """Returns a replacement ArticleWriter.flush raising on the given
+        calls, counted from 1."""
+        flush = transform.ArticleWriter.flush
+        calls = []
+
+        def failing(writer):
+            calls.append(writer)
+            if len(calls) in failures:
+                writer.pending = {}
+                writer.pending_count = 0
+                raise DatabaseError('Batch failed.')
+            return flush(writer)
+
+        return failing
+
+    def untransformed(self, articles):
+        return [
+            article.pk for article in articles
+            if article.__class__.objects.get(pk=article.pk).title
+            == article.title
+        ]
+
+    def test_checkpoint_kept_before_failed_batch(self):
+        articles = self.create_articles(12)
+        with mock.patch.object(
+            transform.ArticleWriter,
+            'flush',
+            self.failing_flush({2}),
+        ):
+            self.run_command('jats_to_html', self.ARGS)
+
+        self.assertEqual(
+            list(models.CommandCheckpoint.objects.values_list(
+                'position', flat=True,
+            )),
+            [articles[2].pk],
+        )
+        self.assertEqual(
+            self.untransformed(articles),
+            [article.pk for article in articles[3:6]],
+        )
+
+        self.run_command('jats_to_html', self.ARGS + ['--resume'])
+        self.assertEqual(self.untransformed(articles), [])
+        self.assertFalse(models.CommandCheckpoint.objects.exists())
+
+    def test_first_batch_fails(self):
+        articles = self.create_articles(9)
+        with mock.patch.object(
+            transform.ArticleWriter,
+            'flush',
+            self.failing_flush({1}),
+        ), mock.patch.object(
+            checkpoints,
+            'save_position',
+            wraps=checkpoints.save_position,
+        ) as save_position:
+            self.run_command('jats_to_html', self.ARGS)
+
+        # No position past the failed batch is recorded, even during the run.
+        save_position.assert_not_called()
+        self.assertFalse(models.CommandCheckpoint.objects.exists())
+        self.run_command('jats_to_html', self.ARGS + ['--resume'])
+        self.assertEqual(self.untransformed(articles), [])
@@ -0,0 +1,729 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import traceback
+
+from django.db import connections, transaction
+from django.db.models import Prefetch, Q
+from lxml import etree
+
+from core import files
+from core.models import Galley
+from submission.models import Article
+from journal.models import Journal, Issue
+from plugins.scripts import jats, models, profiling
+
+
+def plan_article_ids(log, journal_codes=None, issue_ids=None, article_id=None):
+    """Returns a queryset of the primary keys of the articles selected by any
+    of the journal codes, issue IDs or article ID, each appearing once, or
+    None if nothing could be selected. Selectors that do not exist are
+    logged.
+    """
+    selectors = Q()
+
+    if journal_codes:
+        found = set(
+            Journal.objects.filter(
+                code__in=journal_codes,
+            ).values_list('code', flat=True)
+        )
+        for journal_code in journal_codes:
+            if journal_code not in found:
+                log(f'Journal with code "{journal_code}" does not exist.', 'error')
+        if found:
+            selectors |= Q(journal__code__in=found)
+
+    if issue_ids:
+        found = set(
+            Issue.objects.filter(
+                id__in=issue_ids,
+            ).values_list('id', flat=True)
+        )
+        for issue_id in issue_ids:
+            if issue_id not in found:
+                log(f'Issue with ID "{issue_id}" does not exist.', 'error')
+        if found:
+            selectors |= Q(
+                pk__in=Issue.articles.through.objects.filter(
+                    issue_id__in=found,
+                ).values('article_id'),
+            )
+
+    if article_id:
+        if Article.objects.filter(pk=article_id).exists():
+            selectors |= Q(pk=article_id)
+        else:
+            log(f'Article with ID "{article_id}" does not exist.', 'error')
+
+    if not selectors:
+        return None
+
+    return Article.objects.filter(
+        selectors,
+    ).order_by('pk').values_list('pk', flat=True)
+
+
+def fetch_articles(article_ids, chunk_size=500):
+    """Yields the articles for a queryset of primary keys.
+
+    Primary keys are streamed from a single query and the articles are
+    fetched a chunk at a time with their XML galleys and files prefetched,
+    so the number of queries is constant per chunk.
+    """
+    xml_galleys = Galley.objects.filter(
+        file__mime_type__in=files.XML_MIMETYPES,
+    ).select_related('file')
+    if not xml_galleys.ordered:
+        xml_galleys = xml_galleys.order_by('pk')
+
+    chunk = []
+    for pk in article_ids.iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            yield from _fetch_articles(chunk, xml_galleys)
+            chunk = []
+    if chunk:
+        yield from _fetch_articles(chunk, xml_galleys)
+
+
+def _fetch_articles(article_ids, xml_galleys):
+    with profiling.stage('fetch_articles'):
+        return list(Article.objects.filter(
+            pk__in=article_ids,
+        ).order_by('pk').prefetch_related(
+            Prefetch(
+                'galley_set',
+                queryset=xml_galleys,
+                to_attr=jats.PREFETCHED_XML_GALLEYS,
+            ),
+        ))
+
+
+class TransformResult:
+    """The outcome of transforming the galley of a single article.
+
+    Results are produced in worker processes when running in parallel, so
+    they only hold plain, picklable values.
+    """
+
+    def __init__(self, article_id, values=None, missing=None, error=None):
+        self.article_id = article_id
+        self.values = values or {}
+        self.missing = missing or []
+        self.error = error
+
+
+def transform_galley(article_id, file_path, mappings, transforms, streaming=True):
+    """Transforms a single galley file without touching the database."""
+    if not os.path.exists(file_path):
+        return TransformResult(
+            article_id,
+            error=f'File path "{file_path}" does not exist for article ID {article_id}.',
+        )
+
+    try:
+        values, missing = jats.extract_fields(
+            file_path,
+            mappings,
+            transforms,
+            streaming=streaming,
+        )
+    except etree.XMLSyntaxError as e:
+        return TransformResult(
+            article_id,
+            error=f'XML syntax error for article ID {article_id}: {e}\n{traceback.format_exc()}',
+        )
+    except Exception as e:
+        return TransformResult(
+            article_id,
+            error=f'Error processing article ID {article_id}: {e}\n{traceback.format_exc()}',
+        )
+
+    return TransformResult(article_id, values=values, missing=missing)
+
+
+# State of a worker process, set up once per process by _init_worker.
+_worker = {}
+
+
+def _init_worker(mappings, streaming, engine):
+    _worker["mappings"] = mappings
+    _worker["streaming"] = streaming
+    _worker["transforms"] = jats.load_transforms(mappings, engine)
+
+
+def _transform_task(task):
+    article_id, file_path = task
+    return transform_galley(
+        article_id,
+        file_path,
+        _worker["mappings"],
+        _worker["transforms"],
+        streaming=_worker["streaming"],
+    )
+
+
+class ArticleWriter:
+    """Accumulates changed Articles and writes them with bulk_update.
+
+    Only the changed fields are written and each batch is written in its own
+    transaction. Articles are grouped by the set of fields that changed, as
+    bulk_update writes every listed field for every object it is given.
+
+    :param batch_size: the number of articles written per transaction
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = max(batch_size or 1, 1)
+        self.pending = {}
+        self.pending_count = 0
+
+    @property
+    def full(self):
+        return self.pending_count >= self.batch_size
+
+    def add(self, article, fields):
+        self.pending.setdefault(tuple(fields), []).append(article)
+        self.pending_count += 1
+
+    def flush(self):
+        """Writes all queued articles in a single transaction.
+
+        :return: a list of the (article, fields) written
+        """
+        pending = self.pending
+        self.pending = {}
+        self.pending_count = 0
+
+        with transaction.atomic():
+            for fields, articles in pending.items():
+                Article.objects.bulk_update(articles, fields)
+
+        return [
+            (article, fields)
+            for fields, articles in pending.items()
+            for article in articles
+        ]
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def value_hash(value):
+    return hashlib.sha256((value or '').encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """Decides which articles need transforming using TransformManifest.
+
+    An article is current when, for every mapped field, the galley file and
+    XSLT are unchanged since the last run and the field still holds the
+    value that run wrote. The galley is only hashed when its mtime differs
+    from the one recorded.
+
+    :param mappings: an iterable of jats.FieldMapping
+    """
+
+    def __init__(self, mappings):
+        self.xslt_hashes = {
+            mapping.field: file_hash(mapping.xslt_file) for mapping in mappings
+        }
+        self.entries = {}
+        self.galleys = {}
+        self.pending = {}
+
+    def load(self, articles):
+        """Fetches the entries for a block of articles in one query."""
+        self.galleys = {}
+        self.entries = {
+            (entry.article_id, entry.field): entry
+            for entry in models.TransformManifest.objects.filter(
+                article_id__in=[article.pk for article in articles],
+                field__in=list(self.xslt_hashes),
+            )
+        }
+
+    def is_current(self, article, file_path):
+        """Checks whether an article needs transforming. This must be called
+        for every article before its result is recorded."""
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            return False
+
+        self.galleys[article.pk] = [file_path, mtime, None]
+        touched = False
+        for field, xslt_hash in self.xslt_hashes.items():
+            entry = self.entries.get((article.pk, field))
+            if (
+                entry is None
+                or entry.xslt_hash != xslt_hash
+                or entry.galley_path != file_path
+            ):
+                return False
+
+            if (
+                entry.output_hash is not None
+                and entry.output_hash != value_hash(getattr(article, field))
+            ):
+                return False
+
+            if entry.galley_mtime != mtime:
+                if self.galley_hash(article) != entry.galley_hash:
+                    return False
+                touched = True
+
+        if touched:
+            # Same content under a new mtime, record it to avoid hashing
+            # the galley again next time.
+            self.record(article, {
+                field: self.entries[(article.pk, field)].output_hash
+                for field in self.xslt_hashes
+            })
+        return True
+
+    def galley_hash(self, article):
+        galley = self.galleys[article.pk]
+        if galley[2] is None:
+            galley[2] = file_hash(galley[0])
+        return galley[2]
+
+    def record(self, article, output_hashes):
+        """Queues new entries for an article.
+
+        :param output_hashes: a dict of output hash keyed by field, with None
+            for fields whose element was not in the galley
+        """
+        galley_path, galley_mtime, _ = self.galleys[article.pk]
+        galley_hash = self.galley_hash(article)
+        self.pending[article.pk] = [
+            models.TransformManifest(
+                article_id=article.pk,
+                field=field,
+                galley_path=galley_path,
+                galley_mtime=galley_mtime,
+                galley_hash=galley_hash,
+                xslt_hash=xslt_hash,
+                output_hash=output_hashes.get(field),
+            )
+            for field, xslt_hash in self.xslt_hashes.items()
+        ]
+
+    def record_result(self, article, result):
+        self.record(article, {
+            field: value_hash(value) for field, value in result.values.items()
+        })
+
+    def discard(self):
+        self.pending = {}
+
+    def flush(self):
+        pending = self.pending
+        self.discard()
+        models.TransformManifest.objects.filter(
+            article_id__in=list(pending),
+            field__in=list(self.xslt_hashes),
+        ).delete()
+        models.TransformManifest.objects.bulk_create(
+            [entry for entries in pending.values() for entry in entries]
+        )
+
+
+class TransformSummary:
+    """Counts the outcome of each article handled by a TransformRunner.
+
+    The first MAX_ERRORS errors are kept, without their tracebacks, so the
+    summary stays the same size however many articles are handled.
+    """
+
+    MAX_ERRORS = 20
+
+    CHANGED = 'changed'
+    UNCHANGED = 'unchanged'
+    SKIPPED = 'skipped'
+    MISSING_GALLEY = 'missing_galley'
+    MISSING_ELEMENT = 'missing_element'
+    ERROR = 'error'
+
+    LABELS = (
+        (CHANGED, 'Changed'),
+        (UNCHANGED, 'Unchanged'),
+        (SKIPPED, 'Skipped, galley and XSLT unchanged since last run'),
+        (MISSING_GALLEY, 'No XML galley'),
+        (MISSING_ELEMENT, 'No matching element in galley'),
+        (ERROR, 'Errors'),
+    )
+
+    def __init__(self):
+        self.counts = {outcome: 0 for outcome, _label in self.LABELS}
+        self.errors = []
+        self.errors_omitted = 0
+
+    def add(self, outcome, count=1):
+        self.counts[outcome] += count
+
+    def add_error(self, article_id, message):
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({
+                'article_id': article_id,
+                'message': message.strip().splitlines()[0],
+            })
+        else:
+            self.errors_omitted += 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'counts': dict(self.counts),
+            'errors': list(self.errors),
+            'errors_omitted': self.errors_omitted,
+        }
+
+    def __str__(self):
+        lines = [f'Articles processed: {self.total}']
+        for outcome, label in self.LABELS:
+            lines.append(f'  {label}: {self.counts[outcome]}')
+        return '\n'.join(lines)
+
+
+class TransformRunner:
+    """Applies a set of FieldMappings to the JATS galleys of articles.
+
+    Each galley is parsed once and every mapping is run against the same
+    tree. Changed fields are written in batches by an ArticleWriter.
+
+    Articles are handled in blocks. With more than one worker, galleys are
+    parsed and transformed in a pool of processes that each compile their
+    own XSLT. Articles are selected and saved in this process and results
+    are handled in the same order as the articles, so the output does not
+    depend on the number of workers.
+
+    Unless force is set, articles whose galley, XSLT and output are
+    unchanged since the last run, according to the Manifest, are skipped.
+    Transformed values identical to those already stored are not written.
+    The outcome for every article is counted in a TransformSummary and
+    per-article messages, other than errors, are only logged when verbose.
+
+    :param mappings: an iterable of jats.FieldMapping
+    :param test_run: when True, output the new values without saving them
+    :param streaming: when True, only parse the <front> of each galley
+        unless an element is not found there
+    :param workers: the number of processes used to transform galleys
+    :param batch_size: the number of articles written per transaction
+    :param force: when True, transform articles even if they are current
+    :param block_size: the number of articles whose galleys are looked up
+        and handed to the workers at a time
+    :param progress: a callable taking the number of articles handled so
+        far, called after each block
+    :param diff_file: a text file to which each changed field is written as
+        a line of JSON, once it has been saved
+    :param verbose: when True, log a message for every article
+    :param log: a callable taking a message and a level of "info",
+        "success", "warning" or "error"
+    :param checkpoint: a callable taking the primary key of the last article
+        whose changes have been committed. Articles must be given in order of
+        primary key for it to be used to resume a run. Once a batch fails to
+        save, the checkpoint is no longer advanced, so that resuming the run
+        retries the articles in that batch.
+    :param engine: the jats engine used to transform elements. The native
+        engine gives the same output as the XSLT, so the Manifest does not
+        distinguish between them.
+    """
+
+    def __init__(
+        self,
+        mappings,
+        test_run=False,
+        streaming=True,
+        workers=1,
+        batch_size=500,
+        force=False,
+        block_size=500,
+        progress=None,
+        diff_file=None,
+        verbose=False,
+        log=None,
+        checkpoint=None,
+        engine=jats.XSLT_ENGINE,
+    ):
+        self.mappings = list(mappings)
+        self.engine = engine
+        self.test_run = test_run
+        self.streaming = streaming
+        self.workers = max(workers or 1, 1)
+        self.force = force
+        self.block_size = max(block_size or 1, 1)
+        self.progress = progress
+        self.processed = 0
+        self.diff_file = diff_file
+        self.verbose = verbose
+        self.log = log or (lambda message, level='info': None)
+        self.checkpoint = checkpoint
+        self.last_article_pk = None
+        self.checkpoint_pk = None
+        self.save_failed = False
+        self.summary = TransformSummary()
+        self.pending_changes = []
+        self.writer = ArticleWriter(batch_size)
+        self.manifest = None if test_run else Manifest(self.mappings)
+        self.transforms = jats.load_transforms(self.mappings, engine)
+
+    def run(self, articles):
+        pool = None
+        if self.workers > 1:
+            # Forked workers must not share this process's database
+            # connections.
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.mappings, self.streaming, self.engine),
+            )
+
+        try:
+            block = []
+            for article in articles:
+                block.append(article)
+                if len(block) >= self.block_size:
+                    self.process_block(block, pool)
+                    block = []
+            if block:
+                self.process_block(block, pool)
+        finally:
+            if pool:
+                pool.terminate()
+        self.flush()
+        return self.summary
+
+    def process_block(self, articles, pool=None):
+        if self.manifest:
+            with profiling.stage('manifest_load'):
+                self.manifest.load(articles)
+
+        # Skipped and missing galleys are logged as the results are handled
+        # rather than up front, so messages stay in article order.
+        tasks = []
+        for article in articles:
+            try:
+                with profiling.stage('galley_lookup'):
+                    file_path = jats.get_galley_file_path(article)
+            except Exception as e:
+                tasks.append((
+                    article,
+                    None,
+                    TransformSummary.ERROR,
+                    f'Error processing article ID {article.pk}: {e}\n{traceback.format_exc()}',
+                ))
+                continue
+
+            if not file_path:
+                tasks.append((
+                    article,
+                    None,
+                    TransformSummary.MISSING_GALLEY,
+                    f'No XML galley found for article ID {article.pk}',
+                ))
+            elif self.is_current(article, file_path) and not self.force:
+                tasks.append((
+                    article,
+                    None,
+                    TransformSummary.SKIPPED,
+                    f'Skipping unchanged article ID {article.pk}',
+                ))
+            else:
+                tasks.append((article, file_path, None, None))
+
+        galleys = [
+            (article.pk, file_path)
+            for article, file_path, _outcome, _message in tasks if file_path
+        ]
+        if pool:
+            results = pool.imap(
+                _transform_task,
+                galleys,
+                chunksize=max(len(galleys) // (self.workers * 4), 1),
+            )
+        else:
+            results = (
+                transform_galley(
+                    article_id,
+                    file_path,
+                    self.mappings,
+                    self.transforms,
+                    streaming=self.streaming,
+                )
+                for article_id, file_path in galleys
+            )
+
+        levels = {
+            TransformSummary.ERROR: 'error',
+            TransformSummary.MISSING_GALLEY: 'warning',
+        }
+        for article, file_path, outcome, message in tasks:
+            self.last_article_pk = article.pk
+            if file_path:
+                # With workers this is the time spent waiting for them.
+                with profiling.stage('transform'):
+                    result = next(results)
+                self.handle_result(article, result)
+            else:
+                self.summary.add(outcome)
+                if outcome == TransformSummary.ERROR:
+                    self.summary.add_error(article.pk, message)
+                self.log_article(message, levels.get(outcome, 'info'))
+
+        if self.manifest and len(self.manifest.pending) >= self.writer.batch_size:
+            self.flush()
+        elif not (self.writer.pending_count or self.manifest and self.manifest.pending):
+            self.save_checkpoint()
+
+        self.processed += len(articles)
+        if self.progress:
+            self.progress(self.processed)
+
+    def is_current(self, article, file_path):
+        if not self.manifest:
+            return False
+        with profiling.stage('manifest_check'):
+            return self.manifest.is_current(article, file_path)
+
+    def log_article(self, message, level='info'):
+        if self.verbose or level == 'error':
+            self.log(message, level)
+
+    def handle_result(self, article, result):
+        if result.error:
+            self.summary.add(TransformSummary.ERROR)
+            self.summary.add_error(article.pk, result.error)
+            self.log_article(result.error, 'error')
+            return
+
+        for name in result.missing:
+            self.log_article(
+                f'No {name} found in the JATS file for article ID {article.pk}.',
+                'warning',
+            )
+
+        if self.manifest:
+            self.manifest.record_result(article, result)
+
+        if not result.values:
+            self.summary.add(TransformSummary.MISSING_ELEMENT)
+            return
+
+        changes = [
+            (field, getattr(article, field), value)
+            for field, value in result.values.items()
+            if getattr(article, field) != value
+        ]
+        if not changes:
+            self.summary.add(TransformSummary.UNCHANGED)
+            self.log_article(f'No changes for article ID {article.pk}')
+            return
+
+        self.summary.add(TransformSummary.CHANGED)
+
+        if self.test_run:
+            self.log(self.format_test_output(article, result.values))
+            self.write_diff(article.pk, changes)
+            return
+
+        for field, _old, value in changes:
+            setattr(article, field, value)
+        self.writer.add(article, [field for field, _old, _new in changes])
+        self.pending_changes.append((article.pk, changes))
+        if self.writer.full:
+            self.flush()
+
+    def write_diff(self, article_id, changes):
+        if not self.diff_file:
+            return
+        for field, old, new in changes:
+            self.diff_file.write(json.dumps({
+                'article_id': article_id,
+                'field': field,
+                'old': old,
+                'new': new,
+            }) + '\n')
+
+    def flush(self):
+        manifest_pending = self.manifest and self.manifest.pending
+        if not (self.writer.pending_count or manifest_pending):
+            return
+
+        pending = [
+            article
+            for articles in self.writer.pending.values()
+            for article in articles
+        ]
+        pending_changes = self.pending_changes
+        self.pending_changes = []
+        try:
+            with profiling.stage('save'), transaction.atomic():
+                written = self.writer.flush()
+                if manifest_pending:
+                    self.manifest.flush()
+        except Exception as e:
+            if self.manifest:
+                self.manifest.discard()
+            if self.checkpoint and not self.save_failed:
+                self.log(
+                    f'A batch failed to save, the checkpoint is kept at '
+                    f'article ID {self.checkpoint_pk}.',
+                    'warning',
+                )
+            self.save_failed = True
+            self.summary.add(TransformSummary.CHANGED, -len(pending))
+            self.summary.add(TransformSummary.ERROR, len(pending))
+            for article in pending:
+                message = f'Error saving article ID {article.pk}: {e}'
+                self.summary.add_error(article.pk, message)
+                self.log_article(
+                    f'{message}\n{traceback.format_exc()}',
+                    'error',
+                )
+            return
+
+        self.save_checkpoint()
+
+        for article_id, changes in pending_changes:
+            self.write_diff(article_id, changes)
+
+        for article, fields in written:
+            self.log_article(
+                f'Successfully transformed {", ".join(fields)} for article ID {article.pk}',
+                'success',
+            )
+
+    def save_checkpoint(self):
+        """Records that every article handled so far has been committed."""
+        if (
+            not self.checkpoint
+            or self.save_failed
+            or self.last_article_pk == self.checkpoint_pk
+        ):
+            return
+        self.checkpoint(self.last_article_pk)
+        self.checkpoint_pk = self.last_article_pk
+
+    def format_test_output(self, article, values):
+        lines = [
+            f'Article PK: {article.pk}',
+            f'Title: {article.title}',
+        ]
+        for mapping in self.mappings:
+            if mapping.field in values:
+                lines.append(f'New {mapping.label}:\n{values[mapping.field]}')
+        lines.append('----------------------------------------')
+        return '\n'.join(lines)
@@ -13,4 +13,24 @@ urlpatterns = [
         views.transform_title_view,
         name="transform_titles",
     ),
+    re_path(
+        r"^transform-jats/$",
+        views.transform_view,
+        name="transform_jats",
+    ),
+    re_path(
+        r"^export-reviews/$",
+        views.export_reviews_view,
+        name="export_reviews",
+    ),
+    re_path(
+        r"^jobs/(?P<job_id>\d+)/$",
+        views.transform_job_view,
+        name="transform_job",
+    ),
+    re_path(
+        r"^jobs/(?P<job_id>\d+)/log/$",
+        views.transform_job_log_view,
+        name="transform_job_log",
+    ),
 ]
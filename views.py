@@ -1,17 +1,20 @@
-import io
 import os
-import traceback
 
 from django.contrib import messages
-from django.core.management import call_command
-from django.http import HttpResponseRedirect
-from django.shortcuts import render
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect, render
 from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
 
 from submission.models import Article
 from journal.models import Issue
-from plugins.scripts.forms import TransformForm
+from plugins.scripts import jats, jobs, models, reviews, transform
+from plugins.scripts.forms import TransformForm, JATSTransformForm
 
 
 XSLT_FILE_PATH = os.path.join(
@@ -38,71 +41,105 @@ def scripts_manager(request):
     return render(request, template, context)
 
 
+def enqueue_transform(request, form, command, options):
+    """
+    Adds the article, issue or journal selected in a TransformForm to the
+    command options and queues the command as a background job.
+
+    :return: a redirect to the job status page, or back to the form if the
+        article or issue does not belong to the current journal
+    """
+    article_id = form.cleaned_data.get("article_id")
+    issue_id = form.cleaned_data.get("issue_id")
+    options["engine"] = form.cleaned_data.get("engine") or jats.XSLT_ENGINE
+
+    if article_id:
+        try:
+            article = Article.objects.get(
+                pk=article_id,
+                journal=request.journal,
+            )
+            options["article_id"] = article.pk
+        except Article.DoesNotExist:
+            messages.error(
+                request,
+                f"Article ID {article_id} does not exist for this journal.",
+            )
+            return HttpResponseRedirect(request.path)
+
+    elif issue_id:
+        try:
+            issue = Issue.objects.get(
+                pk=issue_id,
+                journal=request.journal,
+            )
+            options["issue_ids"] = [issue.pk]
+        except Issue.DoesNotExist:
+            messages.error(
+                request,
+                f"Issue ID {issue_id} does not exist for this journal.",
+            )
+            return HttpResponseRedirect(request.path)
+
+    else:
+        options["journal_codes"] = [request.journal.code]
+
+    job = jobs.enqueue(
+        request.journal,
+        command,
+        options,
+        user=request.user,
+    )
+    messages.success(
+        request,
+        "Transformation queued, this page will update as it runs.",
+    )
+    return redirect("transform_job", job_id=job.pk)
+
+
+@staff_member_required
+def export_reviews_view(request):
+    """
+    Streams the review assignment export for the current journal as CSV.
+    """
+    assignments = reviews.get_assignments([request.journal.code])
+
+    if not assignments.exists():
+        messages.warning(
+            request,
+            "No review assignments found for this journal.",
+        )
+        return redirect("scripts_manager")
+
+    element_headers = reviews.get_element_headers(assignments)
+    response = StreamingHttpResponse(
+        reviews.iter_csv(assignments, element_headers),
+        content_type="text/csv",
+    )
+    filename = reviews.get_filename(request.journal.code)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 @staff_member_required
 def transform_abstract_view(
     request,
 ):
     """
-    View to trigger the abstract transformation command.
+    View to queue the abstract transformation command.
     """
     if request.method == "POST":
         form = TransformForm(request.POST)
 
         if form.is_valid():
-            article_id = form.cleaned_data.get("article_id")
-            issue_id = form.cleaned_data.get("issue_id")
-
-            options = {
-                "xslt_file": XSLT_FILE_PATH,
-            }
-
-            if article_id:
-                try:
-                    article = Article.objects.get(
-                        pk=article_id,
-                        journal=request.journal,
-                    )
-                    options["article_id"] = article.pk
-                except Article.DoesNotExist:
-                    messages.error(
-                        request,
-                        f"Article ID {article_id} does not exist for this journal.",
-                    )
-                    return HttpResponseRedirect(request.path)
-
-            elif issue_id:
-                try:
-                    issue = Issue.objects.get(
-                        pk=issue_id,
-                        journal=request.journal,
-                    )
-                    options["issue_ids"] = [issue.pk]
-                except Issue.DoesNotExist:
-                    messages.error(
-                        request,
-                        f"Issue ID {issue_id} does not exist for this journal.",
-                    )
-                    return HttpResponseRedirect(request.path)
-
-            else:
-                options["journal_codes"] = [request.journal.code]
-
-            try:
-                stdout = io.StringIO()
-                call_command(
-                    "jats_abstract_to_html",
-                    stdout=stdout,
-                    stderr=stdout,
-                    **options,
-                )
-                messages.success(request, f"Transformation complete.\n{stdout.getvalue()}")
-            except Exception as e:
-                messages.error(
-                    request,
-                    f"An error occurred: {str(e)}\n{traceback.format_exc()}",
-                )
-
-            return HttpResponseRedirect(request.path)
+            return enqueue_transform(
+                request,
+                form,
+                "jats_abstract_to_html",
+                {
+                    "xslt_file": XSLT_FILE_PATH,
+                },
+            )
 
     else:
         form = TransformForm()
@@ -123,66 +160,20 @@ def transform_title_view(
     request,
 ):
     """
-    View to trigger the title transformation command.
+    View to queue the title transformation command.
     """
     if request.method == "POST":
         form = TransformForm(request.POST)
 
         if form.is_valid():
-            article_id = form.cleaned_data.get("article_id")
-            issue_id = form.cleaned_data.get("issue_id")
-
-            options = {
-                "xslt_file": TITLE_XSLT_FILE_PATH,
-            }
-
-            if article_id:
-                try:
-                    article = Article.objects.get(
-                        pk=article_id,
-                        journal=request.journal,
-                    )
-                    options["article_id"] = article.pk
-                except Article.DoesNotExist:
-                    messages.error(
-                        request,
-                        f"Article ID {article_id} does not exist for this journal.",
-                    )
-                    return HttpResponseRedirect(request.path)
-
-            elif issue_id:
-                try:
-                    issue = Issue.objects.get(
-                        pk=issue_id,
-                        journal=request.journal,
-                    )
-                    options["issue_ids"] = [issue.pk]
-                except Issue.DoesNotExist:
-                    messages.error(
-                        request,
-                        f"Issue ID {issue_id} does not exist for this journal.",
-                    )
-                    return HttpResponseRedirect(request.path)
-
-            else:
-                options["journal_codes"] = [request.journal.code]
-
-            try:
-                stdout = io.StringIO()
-                call_command(
-                    "jats_title_to_html",
-                    stdout=stdout,
-                    stderr=stdout,
-                    **options,
-                )
-                messages.success(request, f"Transformation complete.\n{stdout.getvalue()}")
-            except Exception as e:
-                messages.error(
-                    request,
-                    f"An error occurred: {str(e)}\n{traceback.format_exc()}",
-                )
-
-            return HttpResponseRedirect(request.path)
+            return enqueue_transform(
+                request,
+                form,
+                "jats_title_to_html",
+                {
+                    "xslt_file": TITLE_XSLT_FILE_PATH,
+                },
+            )
 
     else:
         form = TransformForm()
@@ -193,4 +184,93 @@ def transform_title_view(
         {
             "form": form,
         },
-    )
\ No newline at end of file
+    )
+
+
+@staff_member_required
+def transform_view(
+    request,
+):
+    """
+    View to queue a single pass transformation of several article fields.
+    """
+    if request.method == "POST":
+        form = JATSTransformForm(request.POST)
+
+        if form.is_valid():
+            return enqueue_transform(
+                request,
+                form,
+                "jats_to_html",
+                {
+                    "fields": form.cleaned_data.get("field_names"),
+                },
+            )
+
+    else:
+        form = JATSTransformForm()
+
+    return render(
+        request,
+        "transform_form.html",
+        {
+            "form": form,
+        },
+    )
+
+
+@staff_member_required
+def transform_job_view(
+    request,
+    job_id,
+):
+    """
+    Displays the progress and output of a queued transformation.
+    """
+    job = get_object_or_404(
+        models.TransformJob,
+        pk=job_id,
+        journal=request.journal,
+    )
+    summary = job.get_summary()
+    counts = summary.get("counts", {})
+
+    return render(
+        request,
+        "transform_job.html",
+        {
+            "job": job,
+            "summary": summary,
+            "outcomes": [
+                (label, counts[outcome])
+                for outcome, label in transform.TransformSummary.LABELS
+                if outcome in counts
+            ],
+            "has_log": os.path.exists(jobs.get_log_path(job)),
+        },
+    )
+
+
+@staff_member_required
+def transform_job_log_view(
+    request,
+    job_id,
+):
+    """
+    Downloads the full output of a queued transformation.
+    """
+    job = get_object_or_404(
+        models.TransformJob,
+        pk=job_id,
+        journal=request.journal,
+    )
+    log_path = jobs.get_log_path(job)
+    if not os.path.exists(log_path):
+        raise Http404("No log has been written for this job.")
+
+    return FileResponse(
+        open(log_path, "rb"),
+        as_attachment=True,
+        filename=f"transform-job-{job.pk}.log",
+        content_type="text/plain",
+    )